@@ -0,0 +1,26 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cwr_frontend.jsonld_utils import BUNDLED_CONTEXTS, CONTEXT_BUNDLE_DIR, _pyld_extended_loader, bundled_context_path
+
+
+class Command(BaseCommand):
+    help = "Download the JSON-LD contexts used by the app into the context bundle, so they are not fetched at runtime"
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="*", help="Additional context urls to bundle")
+        parser.add_argument("--dir", default=CONTEXT_BUNDLE_DIR, help=f"Directory of the bundle (default: {CONTEXT_BUNDLE_DIR})")
+
+    def handle(self, *args, **options):
+        os.makedirs(options["dir"], exist_ok=True)
+        for url in BUNDLED_CONTEXTS + options["urls"]:
+            try:
+                document = _pyld_extended_loader(url)
+            except Exception as e:
+                raise CommandError(f"Failed to fetch {url}: {e}")
+            with open(bundled_context_path(url, options["dir"]), "w") as f:
+                json.dump(document, f)
+            self.stdout.write(f"Bundled {url}")
+        self.stdout.write(self.style.SUCCESS(f"Bundled contexts in {options['dir']}"))
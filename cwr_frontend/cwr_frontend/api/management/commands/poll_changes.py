@@ -0,0 +1,118 @@
+import time
+from itertools import batched
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cwr_frontend.cache_warming import absolute_uri_builder, warm_dataset
+from cwr_frontend.caching import shared_cache
+from cwr_frontend.cordra.CordraConnector import CordraConnector
+
+# modification time of the newest processed object and the ids of the processed objects modified at that time
+CHECKPOINT_CACHE_KEY = "change-feed-checkpoint"
+# datasets that failed to rebuild, they are rebuilt again with the next poll
+RETRY_CACHE_KEY = "change-feed-retry"
+
+
+class Command(BaseCommand):
+    help = "Poll cordra for modified objects and rebuild the cached graphs, JSON-LD and RO-Crate metadata of affected datasets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=60, help="Seconds between polls (default: 60)")
+        parser.add_argument("--once", action="store_true", help="Poll once and exit")
+        parser.add_argument("--page-size", type=int, default=100, help="Number of objects fetched per search request")
+        parser.add_argument(
+            "--base-url",
+            default=settings.SITE_URL,
+            help="Scheme and host the frontend is served at, i.e. https://example.com. Required to rebuild RO-Crate metadata (default: SITE_URL)",
+        )
+
+    def handle(self, *args, **options):
+        connector = CordraConnector()
+        build_absolute_uri = absolute_uri_builder(options["base_url"]) if options["base_url"] else None
+
+        while True:
+            try:
+                self.poll(connector, options["page_size"], build_absolute_uri)
+            except Exception as e:
+                # keep polling, i.e. if cordra is unavailable or a dataset cannot be processed
+                self.stderr.write(f"Failed to poll cordra: {e}")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+    def poll(self, connector: CordraConnector, page_size: int, build_absolute_uri):
+        checkpoint = shared_cache.get(CHECKPOINT_CACHE_KEY)
+        if checkpoint is not None and not isinstance(checkpoint, dict):
+            checkpoint = {"modified_on": checkpoint, "ids": []}  # checkpoint of a previous version, without ids
+        changed, newest = self.find_changed_objects(connector, checkpoint, page_size)
+        if checkpoint is None:
+            # first run: only remember where to start. Use warm_cache to warm the whole catalog.
+            self.stdout.write(f"No checkpoint found. Watching for changes after {newest['modified_on'] if newest else None}")
+            if newest is not None:
+                shared_cache.set(CHECKPOINT_CACHE_KEY, newest, None)
+            return
+
+        datasets = self.find_affected_datasets(connector, changed) | set(shared_cache.get(RETRY_CACHE_KEY) or [])
+        failed = []
+        for dataset_id in sorted(datasets):
+            start = time.perf_counter()
+            try:
+                warm_dataset(connector, dataset_id, build_absolute_uri, invalidate=True)
+            except Exception as e:
+                failed.append(dataset_id)
+                self.stderr.write(f"Failed to rebuild {dataset_id}: {e}")
+                continue
+            self.stdout.write(f"Rebuilt {dataset_id} in {time.perf_counter() - start:.2f}s")
+
+        # only advance the checkpoint once all changes were processed, failed datasets are retried with the next poll
+        shared_cache.set(RETRY_CACHE_KEY, failed, None)
+        if newest is not None:
+            shared_cache.set(CHECKPOINT_CACHE_KEY, newest, None)
+
+    def find_changed_objects(self, connector: CordraConnector, checkpoint: dict | None, page_size: int) -> tuple[list[dict], dict | None]:
+        """
+        Returns all objects modified since the checkpoint that were not processed yet, and the checkpoint of the newest
+        modification. Objects modified at the time of the checkpoint are compared by id, as several objects can be
+        modified in the same millisecond.
+        """
+        changed: list[dict] = []
+        newest: dict | None = None
+        page_num = 0
+        while True:
+            results = connector.list_modified_objects(page_num, page_size)["results"]
+            for result in results:
+                modified_on = result["metadata"]["modifiedOn"]
+                if newest is None:
+                    newest = {"modified_on": modified_on, "ids": []}
+                if modified_on == newest["modified_on"]:
+                    newest["ids"].append(result["id"])
+                if checkpoint is None or modified_on < checkpoint["modified_on"]:
+                    return changed, newest
+                if modified_on == checkpoint["modified_on"] and result["id"] in checkpoint["ids"]:
+                    continue
+                changed.append(result)
+            if len(results) < page_size:
+                return changed, newest
+            page_num += 1
+
+    def find_affected_datasets(self, connector: CordraConnector, changed: list[dict]) -> set[str]:
+        """
+        Returns the modified datasets, the datasets of modified objects and all of their parents (via isPartOf).
+        Objects that are not linked with isPartOf (i.e. persons or actions) are not traced back to their datasets.
+        """
+        datasets: set[str] = set()
+        to_visit: set[str] = set()
+        for obj in changed:
+            if obj.get("type") == "Dataset":
+                to_visit.add(obj["id"])
+            to_visit.update(obj.get("content", {}).get("isPartOf", []))
+
+        while len(to_visit) > 0:
+            datasets.update(to_visit)
+            parents: set[str] = set()
+            for id_batch in batched(sorted(to_visit), 200):  # cordra throws 502 if request becomes too large
+                for obj in connector.search_for_ids(id_batch):
+                    parents.update(obj["content"].get("isPartOf", []))
+            to_visit = parents - datasets
+        return datasets
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from requests import RequestException
+
+from cwr_frontend.cache_warming import absolute_uri_builder, warm_dataset
+from cwr_frontend.cordra.CordraConnector import CordraConnector
+
+
+class Command(BaseCommand):
+    help = "Resolve and cache the graphs, JSON-LD, workflow graphs and RO-Crate metadata of all datasets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Number of datasets warmed concurrently (default: 4)")
+        parser.add_argument("--page-size", type=int, default=100, help="Number of datasets fetched per search request")
+        parser.add_argument("--top-level-only", action="store_true", help="Skip datasets that are part of other datasets")
+        parser.add_argument(
+            "--base-url",
+            default=settings.SITE_URL,
+            help="Scheme and host the frontend is served at, i.e. https://example.com. Required to cache RO-Crate metadata (default: SITE_URL)",
+        )
+
+    def handle(self, *args, **options):
+        connector = CordraConnector()
+        build_absolute_uri = absolute_uri_builder(options["base_url"]) if options["base_url"] else None
+        start = time.perf_counter()
+
+        try:
+            dataset_ids = self.list_dataset_ids(connector, options["page_size"], not options["top_level_only"])
+        except RequestException as e:
+            raise CommandError(f"Failed to list datasets: {e}")
+        self.stdout.write(f"Warming caches of {len(dataset_ids)} datasets with {options['workers']} workers")
+
+        def warm(dataset_id: str) -> float:
+            dataset_start = time.perf_counter()
+            warm_dataset(connector, dataset_id, build_absolute_uri)
+            return time.perf_counter() - dataset_start
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {executor.submit(warm, dataset_id): dataset_id for dataset_id in dataset_ids}
+            for i, future in enumerate(as_completed(futures), start=1):
+                dataset_id = futures[future]
+                try:
+                    duration = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"[{i}/{len(dataset_ids)}] Failed to warm {dataset_id}: {e}")
+                    continue
+                self.stdout.write(f"[{i}/{len(dataset_ids)}] {dataset_id} in {duration:.2f}s")
+
+        summary = f"Warmed {len(dataset_ids) - failed} of {len(dataset_ids)} datasets in {time.perf_counter() - start:.1f}s"
+        if failed > 0:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def list_dataset_ids(self, connector: CordraConnector, page_size: int, include_nested: bool) -> list[str]:
+        dataset_ids: list[str] = []
+        page_num = 0
+        while True:
+            response = connector.list_datasets(page_num, page_size, include_nested, fields=["/id"])
+            dataset_ids += [result["id"] for result in response["results"]]
+            if len(response["results"]) < page_size or len(dataset_ids) >= response["size"]:
+                return dataset_ids
+            page_num += 1
@@ -11,11 +11,7 @@ class WorkflowStatusSerializer(serializers.Serializer):
     details = serializers.DictField(required=False)
 
 
-class WorkflowSubmissionSerializer(serializers.Serializer):
-    rocratefile = serializers.FileField(
-        required=True,
-        help_text="The RO-Crate ZIP file containing a workflow.yaml file.",
-    )
+class WorkflowSubmissionOptionsSerializer(serializers.Serializer):
     dry_run = serializers.BooleanField(
         required=False,
         default=False,
@@ -64,6 +60,32 @@ class WorkflowSubmissionSerializer(serializers.Serializer):
         return value
 
 
+class WorkflowSubmissionSerializer(WorkflowSubmissionOptionsSerializer):
+    rocratefile = serializers.FileField(
+        required=True,
+        help_text="The RO-Crate ZIP file containing a workflow.yaml file.",
+    )
+
+
+class UploadCreateSerializer(serializers.Serializer):
+    size = serializers.IntegerField(
+        min_value=1,
+        help_text="Size of the RO-Crate ZIP file in bytes.",
+    )
+    checksum = serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$",
+        required=False,
+        default=None,
+        help_text="Hex encoded SHA-256 checksum of the whole RO-Crate ZIP file. If given, it is verified when the upload is finalized.",
+    )
+
+
+class UploadStatusSerializer(serializers.Serializer):
+    upload_id = serializers.CharField()
+    size = serializers.IntegerField(help_text="Size of the RO-Crate ZIP file in bytes.")
+    offset = serializers.IntegerField(help_text="Number of bytes received, i.e. the offset of the next chunk.")
+
+
 class WorkflowGraphRequestSerializer(serializers.Serializer):
     file = serializers.FileField(
         required=False,
@@ -7,6 +7,9 @@ urlpatterns = [
     path('workflows', views.SubmitWorkflowView.as_view(), name='submit-workflow-api'),
     path('workflows/<str:workflow_id>', views.WorkflowStatusView.as_view(), name='workflow-status-api'),
     path('workflows/<str:workflow_id>/download', views.WorkflowDownloadView.as_view(), name='workflow-download-api'),
+    path('uploads', views.WorkflowUploadView.as_view(), name='workflow-upload-api'),
+    path('uploads/<str:upload_id>', views.WorkflowUploadDetailView.as_view(), name='workflow-upload-detail-api'),
+    path('uploads/<str:upload_id>/finalize', views.WorkflowUploadFinalizeView.as_view(), name='workflow-upload-finalize-api'),
     path('workflow-graph', views.WorkflowGraphView.as_view(), name='workflow-graph-api'),
     path('schema/', SpectacularAPIView.as_view(), name = 'schema'),
     path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name = 'swagger-ui'),
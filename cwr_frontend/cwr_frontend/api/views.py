@@ -5,18 +5,24 @@ from django.http import JsonResponse, HttpResponseBase
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from requests import HTTPError, ConnectionError
-from typing import Optional, Any
+from typing import Optional, Any, cast
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
-from cwr_frontend.rocrate_io import get_crate_workflow_from_zip, as_ROCrate
+from cwr_frontend.rocrate_io import as_ROCrate
+from cwr_frontend.rocrate_upload import get_crate_workflow_from_zip
+from cwr_frontend.rocrate_zip import COMPRESSION_MODES
+from cwr_frontend.upload_store import ChecksumMismatch, UploadConflict, UploadNotFound, UploadStore, get_upload_store, is_checksum
 from cwr_frontend.workflowservice.WorkflowServiceConnector import WorkflowServiceConnector
 from cwr_frontend.workflow_graph import build_workflow_graph
 from cwr_frontend.cordra.CordraConnector import CordraConnector
 from .serializers import (
     WorkflowGraphRequestSerializer,
     WorkflowGraphResponseSerializer,
+    UploadCreateSerializer,
+    UploadStatusSerializer,
     WorkflowStatusSerializer,
+    WorkflowSubmissionOptionsSerializer,
     WorkflowSubmissionSerializer,
 )
 from .models import ApiKeyIdentity, CustomAPIKey
@@ -46,6 +52,68 @@ class ZipRenderer(BaseRenderer):
         return data
 
 
+def api_key_identity(request) -> ApiKeyIdentity:
+    """ Returns the identity of the api key of the request """
+    api_key = request.META["HTTP_API_KEY"]
+    api_key_obj = cast(CustomAPIKey, CustomAPIKey.objects.get_from_key(api_key))
+    return ApiKeyIdentity.objects.get(id = api_key_obj.identity_id)
+
+
+def submit_workflow_crate(connector: WorkflowServiceConnector, request, file, dry_run: bool, webhook_url: Optional[str], force: bool) -> Response:
+    """ Validates the workflow of an RO-Crate zip file and submits it on behalf of the identity of the api key """
+    try:
+        crate, workflow = get_crate_workflow_from_zip(file = file)
+    except ValidationError as e:
+        return workflow_status_response(status = "Invalid RO-Crate", details = {'message':e.message}, status_code=400)
+    
+
+    # check if workflow is valid
+    workflow_lint_status, workflow_lint_result = connector.check_workflow(workflow)
+
+    if not workflow_lint_status:
+        status = "Invalid workflow"
+        return workflow_status_response(status, details=workflow_lint_result, status_code=400)
+    
+    override_parameters = {}
+    for key, value in request.POST.items():
+        if key.startswith("param-"):
+            param_name = key[len("param-"):]
+            override_parameters[param_name] = value
+
+    license = crate.root_dataset["license"]
+    workflow_license = license if isinstance(license, str) else license.id
+
+    # Get submitter information from api key
+    submitter = api_key_identity(request)
+
+    submit_status, submit_result = connector.submit_workflow(
+        workflow=workflow,
+        title=crate.root_dataset.get("name", "Workflow"),
+        description=crate.root_dataset.get("description", None),
+        keywords=crate.root_dataset.get("keywords", []),
+        license=workflow_license,
+        override_parameters=override_parameters,
+        submitter_name=submitter.name,
+        submitter_id=submitter.get_url(),
+        dry_run=dry_run,
+        webhook_url=webhook_url,
+        force=force,
+    )
+
+    if not submit_status:
+        status = "Submission Failed"
+        return workflow_status_response(status, details = submit_result, status_code=400)
+    
+    workflow_id = submit_result['workflow_id']
+
+    if dry_run:
+        status = "Valid Request"            
+        return workflow_status_response(status, workflow_id)
+    
+    status = "Submitted"        
+    return workflow_status_response(status, workflow_id)
+
+
 class SubmitWorkflowView(APIView):
 
     _connector = WorkflowServiceConnector()
@@ -78,64 +146,224 @@ class SubmitWorkflowView(APIView):
         serializer = WorkflowSubmissionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        file = serializer.validated_data['rocratefile']
-        dry_run = serializer.validated_data['dry_run']
-        webhook_url = serializer.validated_data['webhook_url']
-        force = serializer.validated_data['force']
+        return submit_workflow_crate(
+            self._connector,
+            request,
+            file=serializer.validated_data['rocratefile'],
+            dry_run=serializer.validated_data['dry_run'],
+            webhook_url=serializer.validated_data['webhook_url'],
+            force=serializer.validated_data['force'],
+        )
+
+
+# statuses of uploads that cannot be submitted without uploading them again
+_INVALID_UPLOAD_STATUSES = ("Invalid RO-Crate", "Invalid workflow")
+
+
+def upload_conflict_response(e: UploadConflict) -> Response:
+    return Response({"detail": str(e), "offset": e.offset}, status=409)
+
 
+class WorkflowUploadView(APIView):
+    """
+    Resumable upload of large workflow RO-Crates.
+    An upload is created with the size of the zip file, the file is sent in chunks with PUT requests to the upload
+    and the upload is finalized to submit the workflow like with the workflows endpoint.
+    """
+    permission_classes = [HasCustomAPIKey]
+
+    @extend_schema(
+        summary="Create a resumable upload of a workflow RO-Crate.",
+        description=(
+            "Creates an upload of an RO-Crate ZIP file, which is sent in chunks with `PUT /uploads/{upload_id}` "
+            "and submitted with `POST /uploads/{upload_id}/finalize`. Unfinished uploads expire if no chunk is received for a day."
+        ),
+        request=UploadCreateSerializer,
+        responses={
+            201: OpenApiResponse(description="Upload created.", response=UploadStatusSerializer),
+            400: OpenApiResponse(description="Invalid size or checksum."),
+        },
+        tags=["Uploads"],
+    )
+    def post(self, request) -> Response:
+        serializer = UploadCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         try:
-            crate, workflow = get_crate_workflow_from_zip(file = file)
-        except ValidationError as e:
-            return workflow_status_response(status = "Invalid RO-Crate", details = {'message':e.message}, status_code=400)
-        
-
-        # check if workflow is valid
-        workflow_lint_status, workflow_lint_result = self._connector.check_workflow(workflow)
-
-        if not workflow_lint_status:
-            status = "Invalid workflow"
-            return workflow_status_response(status, details=workflow_lint_result, status_code=400)
-        
-        override_parameters = {}
-        for key, value in request.POST.items():
-            if key.startswith("param-"):
-                param_name = key[len("param-"):]
-                override_parameters[param_name] = value
-
-        license = crate.root_dataset["license"]
-        workflow_license = license if isinstance(license, str) else license.id
-
-        # Get submitter information from api key
-        api_key = request.META["HTTP_API_KEY"]
-        api_key_obj = CustomAPIKey.objects.get_from_key(api_key)
-        submitter = ApiKeyIdentity.objects.get(id = api_key_obj.identity_id)
-
-        submit_status, submit_result = self._connector.submit_workflow(
-            workflow=workflow,
-            title=crate.root_dataset.get("name", "Workflow"),
-            description=crate.root_dataset.get("description", None),
-            keywords=crate.root_dataset.get("keywords", []),
-            license=workflow_license,
-            override_parameters=override_parameters,
-            submitter_name=submitter.name,
-            submitter_id=submitter.get_url(),
-            dry_run=dry_run,
-            webhook_url=webhook_url,
-            force=force,
-        )
+            upload = get_upload_store().create(
+                api_key_identity(request).id,
+                size=serializer.validated_data["size"],
+                checksum=serializer.validated_data["checksum"],
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response(UploadStatusSerializer(upload).data, status=201)
+
+
+class WorkflowUploadDetailView(APIView):
+    permission_classes = [HasCustomAPIKey]
+
+    @extend_schema(
+        summary="Get the status of a resumable upload.",
+        description="Returns the number of bytes received, i.e. the offset to resume the upload at.",
+        responses={
+            200: OpenApiResponse(description="Upload status.", response=UploadStatusSerializer),
+            404: OpenApiResponse(description="Upload not found."),
+        },
+        tags=["Uploads"],
+    )
+    def get(self, request, upload_id) -> Response:
+        try:
+            upload = get_upload_store().get(upload_id, api_key_identity(request).id)
+        except UploadNotFound:
+            return Response({"detail": f"Upload {upload_id} not found"}, status=404)
+        return Response(UploadStatusSerializer(upload).data)
+
+    @extend_schema(
+        summary="Upload a chunk of an RO-Crate.",
+        description=(
+            "Appends the raw request body to the upload. The chunk must start at the current offset of the upload. "
+            "It is discarded if its SHA-256 checksum does not match or the request is interrupted, so it can be sent again."
+        ),
+        request={"application/octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                name="Upload-Offset",
+                location=OpenApiParameter.HEADER,
+                description="Offset of the chunk in the file, i.e. the number of bytes uploaded before.",
+                required=True,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="Upload-Checksum",
+                location=OpenApiParameter.HEADER,
+                description="Hex encoded SHA-256 checksum of the chunk.",
+                required=True,
+                type=str,
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(description="Chunk received.", response=UploadStatusSerializer),
+            400: OpenApiResponse(description="Missing headers, checksum mismatch or chunk exceeding the upload."),
+            404: OpenApiResponse(description="Upload not found."),
+            409: OpenApiResponse(description="Chunk does not start at the offset of the upload, which is part of the response, or another chunk is being uploaded."),
+            413: OpenApiResponse(description="Chunk too large."),
+        },
+        tags=["Uploads"],
+    )
+    def put(self, request, upload_id) -> Response:
+        store = get_upload_store()
+        checksum = request.headers.get("Upload-Checksum", "")
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+        except ValueError:
+            return Response({"detail": "Upload-Offset header must be an integer"}, status=400)
+        if not is_checksum(checksum.lower()):
+            return Response({"detail": "Upload-Checksum header must be a hex encoded SHA-256 checksum"}, status=400)
+        if int(request.headers.get("Content-Length") or 0) > store.max_chunk_size:
+            return Response({"detail": f"Chunk is larger than {store.max_chunk_size} bytes"}, status=413)
+
+        # the chunk is streamed to the upload, not read into memory
+        stream = request.stream
+        chunk = iter(lambda: stream.read(64 * 1024), b"") if stream is not None else iter([])
+        try:
+            upload = store.write_chunk(upload_id, api_key_identity(request).id, offset, chunk, checksum)
+        except UploadNotFound:
+            return Response({"detail": f"Upload {upload_id} not found"}, status=404)
+        except UploadConflict as e:
+            return upload_conflict_response(e)
+        except (ChecksumMismatch, ValueError) as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response(UploadStatusSerializer(upload).data)
+
+    @extend_schema(
+        summary="Cancel a resumable upload.",
+        responses={
+            204: OpenApiResponse(description="Upload removed."),
+            404: OpenApiResponse(description="Upload not found."),
+        },
+        tags=["Uploads"],
+    )
+    def delete(self, request, upload_id) -> Response:
+        store = get_upload_store()
+        try:
+            store.get(upload_id, api_key_identity(request).id)
+        except UploadNotFound:
+            return Response({"detail": f"Upload {upload_id} not found"}, status=404)
+        store.remove(upload_id)
+        return Response(status=204)
+
+
+class WorkflowUploadFinalizeView(APIView):
+
+    _connector = WorkflowServiceConnector()
+    permission_classes = [HasCustomAPIKey]
+
+    @extend_schema(
+        summary="Submit a completely uploaded workflow RO-Crate for execution.",
+        description=(
+            "Validates and submits the uploaded RO-Crate like `POST /workflows`. "
+            "The upload is removed once the workflow was submitted or if it is invalid. It is kept after dry runs and "
+            "failed submissions, so finalizing can be retried."
+        ),
+        request={
+            "multipart/form-data": WorkflowSubmissionOptionsSerializer,
+            "application/x-www-form-urlencoded": WorkflowSubmissionOptionsSerializer,
+        },
+        parameters=[
+            OpenApiParameter(
+                name="param-*",
+                location=OpenApiParameter.QUERY,
+                description="Dynamic parameters to override workflow defaults. Format: param-KEY=VALUE",
+                required=False,
+                type=str
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Workflow Status.",
+                response=WorkflowStatusSerializer,
+            ),
+            404: OpenApiResponse(description="Upload not found."),
+            409: OpenApiResponse(description="Upload is incomplete, the offset to resume it at is part of the response, or it is being finalized already."),
+        },
+        tags=["Uploads"],
+    )
+    def post(self, request, upload_id) -> Response:
+        serializer = WorkflowSubmissionOptionsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        store = get_upload_store()
+        try:
+            # concurrent finalize requests must not submit the workflow twice
+            with store.locked(upload_id, api_key_identity(request).id):
+                return self.finalize(request, store, upload_id, serializer.validated_data)
+        except UploadNotFound:
+            return Response({"detail": f"Upload {upload_id} not found"}, status=404)
+        except UploadConflict as e:
+            return upload_conflict_response(e)
+
+    def finalize(self, request, store: UploadStore, upload_id: str, options: dict[str, Any]) -> Response:
+        try:
+            file = store.open(upload_id, api_key_identity(request).id)
+        except ChecksumMismatch as e:
+            store.remove(upload_id)
+            return workflow_status_response(status = "Invalid RO-Crate", details = {'message': str(e)}, status_code=400)
+
+        with file:
+            response = submit_workflow_crate(
+                self._connector,
+                request,
+                file=file,
+                dry_run=options['dry_run'],
+                webhook_url=options['webhook_url'],
+                force=options['force'],
+            )
+        # keep the upload if the submission can be retried, i.e. after errors of the workflow service, or after a dry run
+        status = response.data["status"]
+        if status in _INVALID_UPLOAD_STATUSES or (status == "Submitted" and response.status_code == 200):
+            store.remove(upload_id)
+        return response
 
-        if not submit_status:
-            status = "Submission Failed"
-            return workflow_status_response(status, details = submit_result, status_code=400)
-        
-        workflow_id = submit_result['workflow_id']
-
-        if dry_run:
-            status = "Valid Request"            
-            return workflow_status_response(status, workflow_id)
-        
-        status = "Submitted"        
-        return workflow_status_response(status, workflow_id)
 
 class WorkflowStatusView(APIView):
     permission_classes = [HasCustomAPIKey]
@@ -199,7 +427,7 @@ class WorkflowDownloadView(APIView):
                     "application/json": {"type": "object"},
                 },
             ),
-            400: OpenApiResponse(description="Invalid format parameter."),
+            400: OpenApiResponse(description="Invalid format or compression parameter."),
             404: OpenApiResponse(description="Workflow not found."),
         },
         tags=["Workflows"],
@@ -212,6 +440,13 @@ class WorkflowDownloadView(APIView):
                 enum=["zip", "json"],
                 default="zip",
             ),
+            OpenApiParameter(
+                name="compression",
+                description="Compression of the files in the ZIP archive. `auto` only compresses files that are not compressed already, `store` compresses no files, i.e. for fast local mirrors. Defaults to the setting of the server.",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=list(COMPRESSION_MODES),
+            ),
         ],
     )
     def get(self, request, workflow_id) -> HttpResponseBase:
@@ -228,6 +463,13 @@ class WorkflowDownloadView(APIView):
                 },
                 status=400,
             )
+        if request.GET.get("compression", COMPRESSION_MODES[0]) not in COMPRESSION_MODES:
+            return JsonResponse(
+                {
+                    "detail": f"Invalid compression parameter. Supported values are {', '.join(repr(mode) for mode in COMPRESSION_MODES)}."
+                },
+                status=400,
+            )
 
         try:
             self._connector.get_object_by_id(workflow_id)
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any, BinaryIO
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseBase, StreamingHttpResponse
+
+# temporary files of archives that are still being written, removed if they are left over from a crashed worker
+_TEMP_SUFFIX = ".tmp"
+_TEMP_MAX_AGE = 24 * 60 * 60
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class ArchiveStore:
+    """
+    Directory of built archives, shared by all worker processes.
+
+    Archives are stored under a key derived from the dataset id, its modification time and the options the archive
+    was built with, so a modified dataset is never served from an outdated archive.
+    The total size of the stored archives is kept below max_size by removing the least recently used archives.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(dataset_id: str, modified_on: str, **options: Any) -> str:
+        return hashlib.sha256(json.dumps([dataset_id, modified_on, options], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.zip")
+
+    def get(self, key: str) -> tuple[BinaryIO, int] | None:
+        """
+        Opens a stored archive, marks it as recently used and returns the open file and its size.
+        The archive is opened right away, so it can still be read if it is evicted before it was sent.
+        """
+        path = self.path(key)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted meanwhile, the open file is still readable
+        return file, os.fstat(file.fileno()).st_size
+
+    def store(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Passes the chunks of an archive through and stores the archive once all of them were passed.
+        Nothing is stored if the stream is closed early or the archive is larger than max_size.
+        """
+        temp_file = tempfile.NamedTemporaryFile(dir=self.directory, prefix=f"{key}-", suffix=_TEMP_SUFFIX, delete=False)
+        size = 0
+        try:
+            for chunk in chunks:
+                if not temp_file.closed:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        self._remove_temp_file(temp_file)
+                    else:
+                        temp_file.write(chunk)
+                yield chunk
+            if not temp_file.closed:
+                temp_file.close()
+                os.replace(temp_file.name, self.path(key))
+                self.evict()
+        finally:
+            if not temp_file.closed:
+                self._remove_temp_file(temp_file)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def evict(self):
+        """ Removes the least recently used archives until the store is smaller than max_size """
+        archives = []
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                    if entry.name.endswith(_TEMP_SUFFIX):
+                        if stat.st_mtime < now - _TEMP_MAX_AGE:
+                            os.remove(entry.path)
+                    elif entry.name.endswith(".zip"):
+                        archives.append((stat.st_mtime, stat.st_size, entry.path))
+                except FileNotFoundError:
+                    continue
+
+        total_size = sum(size for _, size, _ in archives)
+        for _, size, path in sorted(archives):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                self._logger.debug(f"Evicted archive {path}")
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    @staticmethod
+    def _remove_temp_file(temp_file):
+        temp_file.close()
+        try:
+            os.remove(temp_file.name)
+        except FileNotFoundError:
+            pass
+
+
+_store: ArchiveStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_archive_store() -> ArchiveStore | None:
+    """ Returns the archive store of the process, or None if no ARCHIVE_DIR is set in ROCRATE_DOWNLOAD """
+    global _store
+    download_settings = getattr(settings, "ROCRATE_DOWNLOAD", {})
+    if not download_settings.get("ARCHIVE_DIR"):
+        return None
+    with _store_lock:
+        if _store is None or _store.directory != str(download_settings["ARCHIVE_DIR"]):
+            _store = ArchiveStore(str(download_settings["ARCHIVE_DIR"]), download_settings.get("ARCHIVE_MAX_SIZE", 10 * 1024 ** 3))
+        return _store
+
+
+def archive_response(request, file: BinaryIO, size: int, etag: str, filename: str, chunk_size: int = 64 * 1024) -> HttpResponseBase:
+    """
+    Responds with a stored archive, opened by ArchiveStore.get, with Content-Length and ETag.
+    Supports conditional requests (If-None-Match) and single byte ranges (Range and If-Range), i.e. to resume downloads.
+    The file is closed once the response was sent.
+    """
+    etag = f'"{etag}"'
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        file.close()
+        not_modified = HttpResponse(status=304)
+        not_modified["ETag"] = etag
+        return not_modified
+
+    byte_range = _parse_range(request.headers.get("Range"), size)
+    if "If-Range" in request.headers and request.headers["If-Range"] != etag:
+        byte_range = None  # the archive changed, send all of it
+
+    response: HttpResponseBase
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=True, filename=filename, content_type="application/zip")
+    elif byte_range == (-1, -1):
+        file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(file, start, end, chunk_size), status=206, content_type="application/zip")
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Disposition"] = f"attachment; filename={filename}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    return response
+
+
+def _parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """ Returns first and last byte of a single range, (-1, -1) if it cannot be satisfied or None to send everything """
+    if not range_header:
+        return None
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if match is None:
+        return None  # multiple or invalid ranges are ignored
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        start = max(size - int(last), 0)  # suffix range, i.e. the last n bytes
+        end = size - 1
+        if int(last) == 0:
+            return -1, -1
+    else:
+        return None
+    if start >= size:
+        return -1, -1
+    return start, end
+
+
+def _read_range(file, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+    with file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,169 @@
+import re
+from typing import Any
+
+# task and step names referenced in depends expressions, i.e. "(a.Succeeded || b) && !c.Failed"
+_DEPENDS_TASK_PATTERN = re.compile(r"([A-Za-z0-9][\w-]*)(?:\.[A-Za-z]+)?")
+# artifacts passed between tasks, i.e. {{tasks.a.outputs.artifacts.result}} or {{inputs.artifacts.data}}
+_ARTIFACT_REFERENCE_PATTERN = re.compile(
+    r"^\{\{\s*(?:(?:tasks|steps)\.([\w-]+)\.outputs|(inputs))\.artifacts\.([\w-]+)\s*\}\}$")
+
+_MAX_DEPTH = 10  # maximum nesting of dag and steps templates
+
+
+class _GraphBuilder:
+    """ Collects nodes and edges of a workflow graph in the format of networkx.cytoscape_data """
+
+    def __init__(self, spec: dict[str, Any]):
+        self.templates = {template["name"]: template for template in spec.get("templates", []) if "name" in template}
+        self.default_gc = _gc_strategy(spec.get("artifactGC"))
+        self.nodes: dict[str, dict[str, Any]] = {}
+        self.edges: dict[tuple[str, str], dict[str, Any]] = {}
+        self.artifact_aliases: dict[str, str] = {}  # output artifacts of dags and steps, passed from their tasks
+
+    def add_node(self, id: str, name: str, type: str, **data: Any):
+        self.nodes[id] = {"data": {"id": id, "value": id, "name": name, "type": type, **data}}
+
+    def add_edge(self, source: str, target: str, type: str):
+        if source != target and (source, target) not in self.edges:
+            self.edges[(source, target)] = {"data": {"source": source, "target": target, "type": type}}
+
+    def add_template(self, template_name: str, prefix: str, inputs: dict[str, str], stack: tuple[str, ...]) -> tuple[list[str], list[str]]:
+        """
+        Adds the nodes of a template (a task, dag or steps) and returns the ids of its entry and exit task nodes.
+        inputs maps names of input artifacts of the template to the ids of their artifact nodes.
+        """
+        template = self.templates.get(template_name)
+        if template is None or template_name in stack or len(stack) >= _MAX_DEPTH:
+            # unknown (i.e. templateRef), recursive or too deeply nested templates are shown as a single task
+            return self.add_task(prefix, template_name, template, inputs)
+        if "dag" in template:
+            tasks = template["dag"].get("tasks", []) or []
+            dependencies = {task["name"]: _task_dependencies(task) for task in tasks}
+            task_ids = self.add_tasks(tasks, dependencies, prefix, inputs, stack + (template_name,))
+            self._add_output_aliases(template, prefix, inputs)
+            return task_ids
+        if "steps" in template:
+            tasks = []
+            dependencies = {}
+            previous_group: list[str] = []
+            for group in template["steps"] or []:
+                group = group if isinstance(group, list) else [group]  # steps are a list of parallel groups
+                for step in group:
+                    tasks.append(step)
+                    dependencies[step["name"]] = previous_group
+                previous_group = [step["name"] for step in group]
+            task_ids = self.add_tasks(tasks, dependencies, prefix, inputs, stack + (template_name,))
+            self._add_output_aliases(template, prefix, inputs)
+            return task_ids
+        return self.add_task(prefix, template_name, template, inputs)
+
+    def add_task(self, id: str, template_name: str, template: dict[str, Any] | None, inputs: dict[str, str]) -> tuple[list[str], list[str]]:
+        id = id or template_name  # the entrypoint is not part of a dag or steps
+        self.add_node(id, id.split(".")[-1], "task", template=template_name)
+        for artifact_id in inputs.values():
+            self.add_edge(artifact_id, id, "data")
+        for artifact in ((template or {}).get("outputs") or {}).get("artifacts", []) or []:
+            artifact_id = f"{id}/{artifact['name']}"
+            gc_strategy = _gc_strategy(artifact.get("artifactGC")) or self.default_gc
+            self.add_node(artifact_id, artifact["name"], "artifact", gc=gc_strategy is not None and gc_strategy != "Never")
+            self.add_edge(id, artifact_id, "data")
+        return [id], [id]
+
+    def add_tasks(self, tasks: list[dict[str, Any]], dependencies: dict[str, list[str]], prefix: str,
+                  inputs: dict[str, str], stack: tuple[str, ...]) -> tuple[list[str], list[str]]:
+        """ Adds the tasks of a dag or steps template and connects them by their dependencies """
+        entries: dict[str, list[str]] = {}
+        exits: dict[str, list[str]] = {}
+        for task in tasks:
+            task_id = f"{prefix}.{task['name']}" if prefix else task["name"]
+            task_inputs = {}
+            for artifact in (task.get("arguments") or {}).get("artifacts", []) or []:
+                source_id = self._artifact_source(artifact, prefix, inputs)
+                if source_id is None:
+                    # artifact from outside of the workflow (i.e. http, git or s3)
+                    source_id = f"{task_id}/{artifact['name']}"
+                    self.add_node(source_id, artifact["name"], "artifact", gc=False)
+                task_inputs[artifact["name"]] = source_id
+            if "template" in task:
+                entries[task["name"]], exits[task["name"]] = self.add_template(task["template"], task_id, task_inputs, stack)
+            else:
+                template_ref = (task.get("templateRef") or {}).get("template", task["name"])
+                entries[task["name"]], exits[task["name"]] = self.add_task(task_id, template_ref, None, task_inputs)
+
+        has_successors = set()
+        for task in tasks:
+            for dependency in dependencies[task["name"]]:
+                if dependency not in exits:
+                    continue
+                has_successors.add(dependency)
+                for source in exits[dependency]:
+                    for target in entries[task["name"]]:
+                        self.add_edge(source, target, "control")
+
+        entry_ids = [id for task in tasks if not any(d in exits for d in dependencies[task["name"]]) for id in entries[task["name"]]]
+        exit_ids = [id for task in tasks if task["name"] not in has_successors for id in exits[task["name"]]]
+        return entry_ids, exit_ids
+
+    def _artifact_source(self, artifact: dict[str, Any], prefix: str, inputs: dict[str, str]) -> str | None:
+        """ Returns the id of the artifact node an input artifact is passed from """
+        match = _ARTIFACT_REFERENCE_PATTERN.match(str(artifact.get("from", "")))
+        if match is None:
+            return None
+        task_name, is_input, artifact_name = match.groups()
+        if is_input:
+            return inputs.get(artifact_name)
+        artifact_id = f"{prefix}.{task_name}/{artifact_name}" if prefix else f"{task_name}/{artifact_name}"
+        artifact_id = self.artifact_aliases.get(artifact_id, artifact_id)
+        return artifact_id if artifact_id in self.nodes else None
+
+    def _add_output_aliases(self, template: dict[str, Any], prefix: str, inputs: dict[str, str]):
+        for artifact in (template.get("outputs") or {}).get("artifacts", []) or []:
+            source_id = self._artifact_source(artifact, prefix, inputs)
+            if source_id is not None:
+                self.artifact_aliases[f"{prefix}/{artifact['name']}"] = source_id
+
+
+def _gc_strategy(artifact_gc: Any) -> str | None:
+    if isinstance(artifact_gc, dict):
+        return artifact_gc.get("strategy") or None
+    return None
+
+
+def _task_dependencies(task: dict[str, Any]) -> list[str]:
+    if "depends" in task:
+        return [match.group(1) for match in _DEPENDS_TASK_PATTERN.finditer(str(task["depends"]))]
+    return list(task.get("dependencies", []) or [])
+
+
+def workflow_to_graph(workflow: dict[str, Any]) -> dict[str, Any]:
+    """
+    Builds the graph of an Argo Workflow (or WorkflowTemplate) in the Cytoscape format returned by the workflow service.
+
+    Tasks of dag and steps templates become task nodes, which are connected by control edges following their
+    dependencies. Templates of nested dags and steps are expanded. Output artifacts become artifact nodes, connected
+    by data edges to the task creating them and the tasks they are passed to. Artifacts are marked with gc if they
+    are garbage collected by Argo.
+    Raises ValueError if the document is not a workflow.
+    """
+    if not isinstance(workflow, dict) or not isinstance(workflow.get("spec"), dict):
+        raise ValueError("Workflow has no spec")
+    spec = workflow["spec"]
+    if not isinstance(spec.get("templates"), list) or len(spec["templates"]) == 0:
+        raise ValueError("Workflow has no templates")
+
+    builder = _GraphBuilder(spec)
+    entrypoint = spec.get("entrypoint") or spec["templates"][0].get("name")
+    try:
+        builder.add_template(entrypoint, "", {}, ())
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid workflow structure: {e}")
+
+    return {
+        "data": [],
+        "directed": True,
+        "multigraph": False,
+        "elements": {
+            "nodes": list(builder.nodes.values()),
+            "edges": list(builder.edges.values()),
+        },
+    }
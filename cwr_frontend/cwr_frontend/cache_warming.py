@@ -0,0 +1,45 @@
+import logging
+from typing import Callable
+from urllib.parse import urljoin
+
+from cwr_frontend.cordra.CordraConnector import CordraConnector
+from cwr_frontend.jsonld_utils import frame_dataset
+from cwr_frontend.object_graph import ObjectGraph
+from cwr_frontend.rocrate_io import crate_metadata
+from cwr_frontend.workflow_graph import cached_workflow_graph, find_workflow
+
+_logger = logging.getLogger(__name__)
+
+
+def absolute_uri_builder(base_url: str) -> Callable[[str], str]:
+    """ Builds absolute urls like request.build_absolute_uri for a frontend served at base_url (scheme and host) """
+    base_url = base_url.rstrip("/") + "/"
+    return lambda location: urljoin(base_url, location)
+
+
+def warm_dataset(connector: CordraConnector, dataset_id: str, build_absolute_uri: Callable[[str], str] | None = None,
+                 invalidate: bool = False):
+    """
+    Resolves and caches everything needed to render a dataset: its object graphs, framed JSON-LD and workflow graph.
+    If build_absolute_uri is given, the metadata of its RO-Crate is cached as well.
+    If invalidate is set, cached graphs are dropped first.
+    """
+    if invalidate:
+        connector.invalidate(dataset_id)
+
+    # graph and structured data of the detail page
+    resolved_objects, graph_version = connector.resolve_objects_versioned(dataset_id, nested=False, workflow_only=False)
+    objects = ObjectGraph(resolved_objects)
+    frame_dataset(dataset_id, objects, graph_version)
+    workflow = find_workflow(objects)
+    if workflow is not None:
+        workflow_id, payload_name = workflow
+        _, status_code = cached_workflow_graph(connector, workflow_id, payload_name)
+        if status_code != 200:
+            _logger.warning(f"Failed to build workflow graph of {dataset_id}")
+
+    # graph and metadata of the RO-Crate
+    if build_absolute_uri is None:
+        connector.resolve_objects(dataset_id, nested=True, workflow_only=False)
+    else:
+        crate_metadata(connector, build_absolute_uri, dataset_id, workflow_only=False, nested=True)
@@ -0,0 +1,292 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from cachetools import LRUCache
+from filelock import FileLock, Timeout
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+_MISSING = object()
+
+
+class SizeBoundedFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that evicts the least recently used entries once the cache directory grows beyond
+    OPTIONS["MAX_SIZE"] bytes or MAX_ENTRIES files, instead of culling random entries by count only.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._max_size = int(params.get("OPTIONS", {}).get("MAX_SIZE", 512 * 1024 * 1024))
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        # mark entry as recently used
+        try:
+            os.utime(self._key_to_file(key, version))
+        except OSError:
+            pass
+        return value
+
+    def _cull(self):
+        entries = []
+        for fname in self._list_cache_files():
+            try:
+                stat = os.stat(fname)
+            except FileNotFoundError:
+                continue  # removed by another process
+            entries.append((stat.st_mtime, stat.st_size, fname))
+
+        total_size = sum(size for (_, size, _) in entries)
+        if len(entries) < self._max_entries and total_size < self._max_size:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        # evict oldest entries until both limits are met, leaving room for 1/cull_frequency new entries
+        max_entries = self._max_entries - self._max_entries // self._cull_frequency
+        max_size = self._max_size - self._max_size // self._cull_frequency
+        entries.sort()
+        num_entries = len(entries)
+        for (_, size, fname) in entries:
+            if num_entries <= max_entries and total_size <= max_size:
+                break
+            self._delete(fname)
+            num_entries -= 1
+            total_size -= size
+
+
+class TwoTierCache:
+    """
+    Small in-process LRU in front of a cache that is shared by all worker processes.
+
+    Values are pickled once on write and stored as bytes in the shared cache, so the local tier can be bounded
+    by their size without serializing them again. Local entries expire after LOCAL_CACHE_TIMEOUT seconds
+    at the latest, so that changes written by other processes become visible.
+    Values returned from the local tier are shared between threads and must not be modified.
+    """
+
+    def __init__(self, alias: str):
+        self._alias = alias
+        self._lock = threading.Lock()
+        self._local = LRUCache(
+            maxsize=getattr(settings, "LOCAL_CACHE_MAX_SIZE", 64 * 1024 * 1024),
+            getsizeof=lambda entry: entry[2],
+        )
+
+    @property
+    def shared(self) -> BaseCache:
+        """ The shared tier. Falls back to the default cache if the alias is not configured """
+        if self._alias in settings.CACHES:
+            return caches[self._alias]
+        return caches[DEFAULT_CACHE_ALIAS]
+
+    def _set_local(self, key: str, value: Any, size: int, timeout: float | None):
+        local_timeout = getattr(settings, "LOCAL_CACHE_TIMEOUT", 60)
+        if timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        with self._lock:
+            if size > self._local.maxsize:
+                self._local.pop(key, None)
+                return
+            self._local[key] = (time.monotonic() + local_timeout, value, size)
+
+    def get(self, key: str, default: Any = None, skip_local: bool = False) -> Any:
+        """
+        Returns the cached value. If skip_local is set, the shared tier is read to see writes of other processes.
+        Values from the local tier are not copied: every caller of the process gets the same object, which callers must
+        not modify. Copy a value before changing it.
+        """
+        if not skip_local:
+            with self._lock:
+                entry = self._local.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+        data = self.shared.get(key)
+        if data is None:
+            return default
+        value = pickle.loads(data)
+        # the remaining lifetime in the shared tier is unknown, so the local timeout is used
+        self._set_local(key, value, len(data), None)
+        return value
+
+    def set(self, key: str, value: Any, timeout: Any = DEFAULT_TIMEOUT):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.shared.set(key, data, timeout)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        self._set_local(key, value, len(data), timeout)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._local.pop(key, None)
+        self.shared.delete(key)
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key within a process:
+    the first caller executes the function, all others wait for and share its result (or exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    created_at: float  # time of the last fetch or successful revalidation
+    version: str | None = None
+    fetched_at: float = 0  # time the value was fetched
+
+    @property
+    def etag(self) -> str:
+        """ Identifies the cached value, i.e. to key caches of results derived from it """
+        return f"{self.version}-{self.fetched_at}"
+
+
+class StaleWhileRevalidateCache:
+    """
+    Serves cached values for fresh_for seconds. Afterwards, values are served stale for up to max_stale seconds
+    while a background thread refreshes them. Older values are refreshed synchronously.
+
+    If get_version is given, a refresh first compares the current version of the value (i.e. a modification
+    time) with the cached one and only fetches the value again if it changed.
+
+    Concurrent refreshes of the same key within a process are coalesced into a single fetch.
+    If lock_dir is given, a file lock additionally makes sure that only one process refreshes a key at a time,
+    while the others wait for and reuse its result.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, cache: TwoTierCache, fresh_for: float, max_stale: float,
+                 lock_dir: str | None = None, lock_timeout: float = 120):
+        self._cache = cache
+        self.fresh_for = fresh_for
+        self.max_stale = max_stale
+        self._lock_dir = lock_dir
+        self._lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._flight = SingleFlight()
+
+    def get(self, key: str, fetch: Callable[[], Any], get_version: Callable[[], str | None] | None = None) -> Any:
+        """ Returns the cached value for key, using fetch to compute it if it is missing or outdated """
+        return self.get_entry(key, fetch, get_version).value
+
+    def get_entry(self, key: str, fetch: Callable[[], Any],
+                  get_version: Callable[[], str | None] | None = None) -> CacheEntry:
+        """ Like get, but returns the cache entry with its version information """
+        entry = self._cache.get(key)
+        if isinstance(entry, CacheEntry):
+            age = time.time() - entry.created_at
+            if age < self.fresh_for:
+                return entry
+            if age < self.fresh_for + self.max_stale:
+                self._refresh_in_background(key, fetch, get_version)
+                return entry
+        return self._refresh(key, fetch, get_version)
+
+    def delete(self, key: str):
+        self._cache.delete(key)
+
+    def _refresh(self, key: str, fetch: Callable[[], Any], get_version: Callable[[], str | None] | None) -> CacheEntry:
+        return self._flight.do(key, lambda: self._refresh_exclusive(key, fetch, get_version))
+
+    def _refresh_exclusive(self, key: str, fetch: Callable[[], Any],
+                           get_version: Callable[[], str | None] | None) -> CacheEntry:
+        if self._lock_dir is None:
+            return self._fetch(key, fetch, get_version, self._cache.get(key))
+
+        os.makedirs(self._lock_dir, exist_ok=True)
+        lock_file = os.path.join(self._lock_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+        try:
+            with FileLock(lock_file, timeout=self._lock_timeout):
+                # another process may have refreshed the value while we were waiting for the lock
+                entry = self._cache.get(key, skip_local=True)
+                if isinstance(entry, CacheEntry) and time.time() - entry.created_at < self.fresh_for:
+                    return entry
+                return self._fetch(key, fetch, get_version, entry)
+        except Timeout:
+            self._logger.warning(f"Timeout while waiting for the refresh lock of {key}")
+            return self._fetch(key, fetch, get_version, self._cache.get(key))
+
+    def _fetch(self, key: str, fetch: Callable[[], Any], get_version: Callable[[], str | None] | None,
+               previous: Any) -> CacheEntry:
+        # the version is read before the value, so a change in between is detected by the next refresh
+        version = get_version() if get_version is not None else None
+        if isinstance(previous, CacheEntry) and version is not None and previous.version == version:
+            entry = CacheEntry(previous.value, time.time(), version, previous.fetched_at)
+        else:
+            now = time.time()
+            entry = CacheEntry(fetch(), now, version, now)
+        # outdated entries are kept (until evicted) so that they can be revalidated
+        self._cache.set(key, entry, None)
+        return entry
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Any],
+                               get_version: Callable[[], str | None] | None):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._refresh(key, fetch, get_version)
+            except Exception as e:
+                self._logger.warning(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"refresh-{key}", daemon=True).start()
+
+
+# cache for expensive results that should be computed once and reused by all worker processes
+shared_cache = TwoTierCache("shared")
@@ -1,9 +1,22 @@
+import json
 from itertools import batched
 from typing import Any, Sequence
 from urllib.parse import urlencode, urljoin
-import requests
 from django.conf import settings
-from django.core.cache import cache
+
+from cwr_frontend.caching import SingleFlight, StaleWhileRevalidateCache, shared_cache
+from cwr_frontend.http_session import get_pooled_session
+
+# resolved object graphs are served stale while they are refreshed in the background
+_graph_cache = StaleWhileRevalidateCache(
+    shared_cache,
+    fresh_for=settings.GRAPH_CACHE["TIMEOUT"],
+    max_stale=settings.GRAPH_CACHE["MAX_STALE"],
+    lock_dir=settings.GRAPH_CACHE["LOCK_DIR"],
+    lock_timeout=settings.CORDRA["GRAPH_TIMEOUT"],
+)
+# concurrent requests for the same object within a worker share one request to cordra
+_object_flight = SingleFlight()
 
 
 class CordraConnector:
@@ -18,6 +31,23 @@ class CordraConnector:
         self.prefix = prefix
         if not self.prefix.endswith("/"):
             self.prefix = prefix + "/"
+        # all connectors of a worker process share one pool of keep-alive connections to cordra
+        self._http = get_pooled_session(
+            "cordra",
+            pool_size=settings.CORDRA["POOL_SIZE"],
+            timeout=settings.CORDRA["TIMEOUT"],
+            retries=settings.CORDRA["RETRIES"],
+            verify=False,
+        )
+        # graph requests are expensive for cordra, so they are not sent again after a read timeout
+        self._graph_http = get_pooled_session(
+            "cordra-graph",
+            pool_size=settings.CORDRA["POOL_SIZE"],
+            timeout=settings.CORDRA["GRAPH_TIMEOUT"],
+            retries=settings.CORDRA["RETRIES"],
+            read_retries=0,
+            verify=False,
+        )
 
     def get_object_abs_url(self, id: str, payload_name: str | None = None) -> str:
         """ Builds the absolute url to a cordra object. If payload name is given, returns the url to the payload."""
@@ -26,8 +56,9 @@ class CordraConnector:
             url += f"?payload={payload_name}"
         return url
 
-    def list_datasets(self, page_num=0, page_size=25, include_nested: bool = False) -> dict[str, Any]:
-        """ retrieve list of objects from cordra """
+    def list_datasets(self, page_num=0, page_size=25, include_nested: bool = False,
+                      fields: Sequence[str] | None = None) -> dict[str, Any]:
+        """ retrieve list of objects from cordra. If fields (JSON pointers, i.e. /content/name) are given, results only contain these """
         query = "type:Dataset"
         if not include_nested:
             query += " AND NOT /isPartOf/_:[* TO *]"  # exclude datasets with the isPartOf property
@@ -37,25 +68,60 @@ class CordraConnector:
             "query": query,
             "sortFields": 'metadata/modifiedOn DESC '
         }
+        if fields is not None:
+            params["filter"] = json.dumps(list(fields))
         url = f'{urljoin(self._base_url, "search")}?{urlencode(params)}'
-        response = requests.get(url, verify=False)
+        response = self._http.get(url, endpoint="search")
         if response.status_code != 200:
             raise Exception(response.text)
 
         return response.json()
 
+    def list_modified_objects(self, page_num=0, page_size=100) -> dict[str, Any]:
+        """ retrieve id, type, isPartOf and modification time of all objects, most recently modified first """
+        params = {
+            "pageNum": page_num,
+            "pageSize": page_size,
+            "query": "*:*",
+            "sortFields": "metadata/modifiedOn DESC",
+            "filter": json.dumps(["/id", "/type", "/content/isPartOf", "/metadata/modifiedOn"]),
+        }
+        url = f'{urljoin(self._base_url, "search")}?{urlencode(params)}'
+        response = self._http.get(url, endpoint="search", auth=(self.user, self.password))
+        response.raise_for_status()
+
+        return response.json()
+
     def get_object_by_id(self, id: str) -> dict[str, Any]:
         """ retrieve object from cordra. Raises if the object was not found. """
-        url = self.get_object_abs_url(id)
-        response = requests.get(url, verify=False)
+        def fetch():
+            url = self.get_object_abs_url(id)
+            response = self._http.get(url, endpoint="objects")
+            response.raise_for_status()
+            return response.json()
+
+        return _object_flight.do(id, fetch)
+
+    def get_payload(self, id: str, payload_name: str) -> bytes:
+        """ retrieve a payload of a cordra object. Raises if the object or payload was not found. """
+        response = self._http.get(self.get_object_abs_url(id, payload_name), endpoint="objects/payload")
         response.raise_for_status()
+        return response.content
 
-        return response.json()
+    def get_modified_on(self, id: str) -> str | None:
+        """ Returns the modification time of a cordra object without fetching its content. Raises if the object was not found. """
+        params = {"full": "true", "filter": json.dumps(["/metadata/modifiedOn"])}
+        url = f"{self.get_object_abs_url(id)}?{urlencode(params)}"
+        response = self._http.get(url, endpoint="objects/metadata", auth=(self.user, self.password))
+        response.raise_for_status()
+
+        modified_on = response.json().get("metadata", {}).get("modifiedOn")
+        return str(modified_on) if modified_on is not None else None
 
     def search_for_ids(self, ids: Sequence[str]) -> list[dict[str, Any]]:
         url = urljoin(self._base_url, "search")
         url = f"{url}?{urlencode({'query': ' OR '.join(['id:' + id for id in ids])})}"
-        response = requests.get(url, verify=False)
+        response = self._http.get(url, endpoint="search")
         response.raise_for_status()
 
         return response.json()["results"]
@@ -118,7 +184,7 @@ class CordraConnector:
             else:
                 params["method"] = "asGraph"
         url = f"{url}?{urlencode(params)}"
-        response = requests.get(url, verify=False, auth=(self.user, self.password))
+        response = self._graph_http.get(url, endpoint="cordra/call", auth=(self.user, self.password))
         response.raise_for_status()
 
         return response.json()["@graph"]
@@ -126,10 +192,27 @@ class CordraConnector:
     def resolve_objects(self, object_id: str, nested: bool = False, workflow_only: bool = False) -> dict[str, dict[str, Any]]:
         """ Recursively resolves cordra objects until the max recursion depth is reached.
         Returns a map of all resolved objects in the form {object_id: object}
+        Cached graphs are revalidated against the modification time of the root object.
+        """
+        return self.resolve_objects_versioned(object_id, nested, workflow_only)[0]
+
+    def resolve_objects_versioned(self, object_id: str, nested: bool = False, workflow_only: bool = False) -> tuple[dict[str, dict[str, Any]], str]:
+        """ Like resolve_objects, but also returns a version string that changes whenever the graph is fetched again.
+        Used to key caches of results derived from the graph.
         """
-        cache_key = f"dataset-objects-{object_id}-nested={nested}-workflow_only={workflow_only}"
-        objects = cache.get(cache_key)
-        if objects is None:
-            objects = dict(map(lambda obj: (obj["@id"], obj), self._resolve_object_graph(object_id, nested, workflow_only)))
-            cache.set(cache_key, objects, 15*60)
-        return objects
+        entry = _graph_cache.get_entry(
+            self._graph_cache_key(object_id, nested, workflow_only),
+            lambda: dict(map(lambda obj: (obj["@id"], obj), self._resolve_object_graph(object_id, nested, workflow_only))),
+            get_version=lambda: self.get_modified_on(object_id),
+        )
+        return entry.value, entry.etag
+
+    def invalidate(self, object_id: str):
+        """ Removes all cached graphs of the given object """
+        for nested in [False, True]:
+            for workflow_only in [False, True]:
+                _graph_cache.delete(self._graph_cache_key(object_id, nested, workflow_only))
+
+    @staticmethod
+    def _graph_cache_key(object_id: str, nested: bool, workflow_only: bool) -> str:
+        return f"dataset-objects-{object_id}-nested={nested}-workflow_only={workflow_only}"
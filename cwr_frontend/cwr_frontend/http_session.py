@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS_CODES = (502, 503, 504)
+RETRY_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """ HTTPAdapter that applies a default timeout to requests that do not set their own """
+
+    def __init__(self, timeout: float | None = None, **kwargs):
+        self._timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if timeout is None:
+            timeout = self._timeout
+        return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+
+class LatencyStats:
+    """ Thread-safe request counters and cumulative latency per endpoint """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, float]] = {}
+
+    def record(self, endpoint: str, seconds: float, failed: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """ Returns a copy of the counters with the average latency of each endpoint """
+        with self._lock:
+            return {
+                endpoint: dict(stats, avg_seconds=stats["total_seconds"] / stats["count"])
+                for endpoint, stats in self._stats.items()
+            }
+
+
+class PooledSession:
+    """
+    Keep-alive connection pool to an upstream service, shared by all threads of a worker process.
+
+    requests.Session is not thread-safe, so each thread gets its own session. All sessions mount the
+    same adapter, i.e. they share one (thread-safe) urllib3 connection pool.
+    Idempotent requests are retried with exponential backoff on connection errors and 502/503/504.
+    read_retries limits the retries after read errors (i.e. timeouts), which are not limited by default.
+    Latency of every request is recorded per endpoint in stats.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, pool_size: int = 10, timeout: float | None = 30, retries: int = 3,
+                 backoff_factor: float = 0.5, verify: bool = True, read_retries: int | None = None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.read_retries = read_retries
+        self.backoff_factor = backoff_factor
+        self.verify = verify
+        self._adapter: _TimeoutHTTPAdapter | None = None
+        self._adapter_pid: int | None = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = LatencyStats()
+
+    def _get_adapter(self) -> _TimeoutHTTPAdapter:
+        # open connections must not be shared between forked worker processes
+        pid = os.getpid()
+        with self._lock:
+            if self._adapter is None or self._adapter_pid != pid:
+                retry = Retry(
+                    total=self.retries,
+                    # False raises read errors as they are instead of wrapping them in a MaxRetryError
+                    read=False if self.read_retries == 0 else self.read_retries,
+                    backoff_factor=self.backoff_factor,
+                    status_forcelist=RETRY_STATUS_CODES,
+                    allowed_methods=RETRY_METHODS,
+                    raise_on_status=False,
+                )
+                self._adapter = _TimeoutHTTPAdapter(timeout=self.timeout, pool_maxsize=self.pool_size, max_retries=retry)
+                self._adapter_pid = pid
+            return self._adapter
+
+    @property
+    def session(self) -> requests.Session:
+        """ The session of the calling thread """
+        adapter = self._get_adapter()
+        session = getattr(self._local, "session", None)
+        if session is None or session.get_adapter("https://") is not adapter:
+            session = requests.Session()
+            session.verify = self.verify
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method: str, url: str, endpoint: str | None = None, idempotent: bool = False,
+                **kwargs: Any) -> requests.Response:
+        """
+        Send a request with the session of the calling thread.
+
+        params:
+            endpoint - name to record the latency under, defaults to the method and host
+            idempotent - retry methods other than GET/HEAD/OPTIONS, i.e. POSTs without side effects
+        """
+        endpoint = endpoint or f"{method.upper()} {urlparse(url).netloc}"
+        # GET/HEAD/OPTIONS are retried by the adapter already
+        attempts = self.retries + 1 if idempotent and method.upper() not in RETRY_METHODS else 1
+        read_errors = 0
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.stats.record(endpoint, time.perf_counter() - start, failed=True)
+                if isinstance(e, requests.ReadTimeout):
+                    read_errors += 1
+                if attempt == attempts - 1 or (self.read_retries is not None and read_errors > self.read_retries):
+                    raise
+                continue
+            elapsed = time.perf_counter() - start
+            self.stats.record(endpoint, elapsed, failed=response.status_code >= 500)
+            self._logger.debug(f"{method} {endpoint} -> {response.status_code} in {elapsed:.3f}s")
+            if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                break
+        return response
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_sessions: dict[str, PooledSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_pooled_session(name: str, **kwargs: Any) -> PooledSession:
+    """ Returns the process-wide session registered under name. kwargs are only used when it is first created. """
+    with _sessions_lock:
+        if name not in _sessions:
+            _sessions[name] = PooledSession(**kwargs)
+        return _sessions[name]
@@ -1,5 +1,9 @@
+import functools
 import json
+import os
 import re
+import threading
+from collections.abc import Mapping
 from typing import Any
 
 from pyld import jsonld
@@ -10,32 +14,83 @@ import urllib.parse as urllib_parse
 from django.core.cache import cache
 import hashlib
 
+from cwr_frontend.caching import shared_cache
 
-def cached_frame(input_doc: dict[str, Any] | list[Any], frame: dict[str, Any], cache_time: int = 60 * 60 * 24, skip_cache: bool = False) -> dict[str, Any]:
-    cache_key = hashlib.sha1(json.dumps([input_doc, frame]).encode('utf-8')).hexdigest()
+
+def frame_dataset(object_id: str, objects: Mapping[str, dict[str, Any]], version: str | None = None) -> dict[str, Any]:
+    """ Frames the objects of a dataset into a single schema.org JSON-LD document with the dataset at its root.
+    version identifies the objects (i.e. the version of their graph) and is used as cache key instead of the objects.
+    """
+    jsonld.set_document_loader(pyld_caching_document_loader)
+    return cached_frame({"@graph": list(objects.values())}, {"@context": "https://schema.org", "@graph": [{"name": objects[object_id]["name"]}]},
+                        version=f"{object_id}-{version}" if version is not None else None)
+
+
+def cached_frame(input_doc: dict[str, Any] | list[Any], frame: dict[str, Any], cache_time: int = 60 * 60 * 24, skip_cache: bool = False,
+                 version: str | None = None) -> dict[str, Any]:
+    """ jsonld.frame with results cached in the cache shared by all worker processes.
+    If version is given, it identifies the input document in the cache key, so the document does not need to be hashed.
+    Cached results are shared and must not be modified.
+    """
+    if version is not None:
+        cache_key = "jsonld-frame-" + hashlib.sha1(json.dumps([version, frame]).encode('utf-8')).hexdigest()
+    else:
+        cache_key = "jsonld-frame-" + hashlib.sha1(json.dumps([input_doc, frame]).encode('utf-8')).hexdigest()
     if not skip_cache:
-        response = cache.get(cache_key)
-        if response is not None:
-            cached_framed = json.loads(response)
-            if isinstance(cached_framed, dict):
-                return cached_framed
+        cached_framed = shared_cache.get(cache_key)
+        if isinstance(cached_framed, dict):
+            return cached_framed
     framed = jsonld.frame(input_doc, frame)
     if not isinstance(framed, dict):
         raise TypeError("jsonld.frame returned a non-dict JSON-LD structure")
-    cache.set(cache_key, json.dumps(framed), cache_time)
+    shared_cache.set(cache_key, framed, cache_time)
     return framed
 
 
+# contexts used by the app. They are bundled with the app by the fetch_jsonld_contexts command.
+BUNDLED_CONTEXTS = [
+    "https://schema.org",
+    "https://schema.org/",
+    "https://w3id.org/ro/crate/1.1/context",
+    "https://www.researchobject.org/ro-terms/workflow-run/context.jsonld",
+]
+CONTEXT_BUNDLE_DIR = os.path.join(os.path.dirname(__file__), "jsonld_contexts")
+
+# documents loaded by this process, parsed once
+_loaded_documents: dict[str, dict[str, Any]] = {}
+_loaded_documents_lock = threading.Lock()
+
+
+def bundled_context_path(url: str, bundle_dir: str | None = None) -> str:
+    return os.path.join(bundle_dir or CONTEXT_BUNDLE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
 def pyld_caching_document_loader(url, options={}, cache_time=60 * 60 * 24, skip_cache=False):
-    """ PyLD document loader that caches results in django cache """
+    """
+    PyLD document loader that loads contexts from the bundle shipped with the app, or fetches and caches them in django cache.
+    Documents are kept in memory once loaded. They are tagged as static, so that PyLD keeps the resolved and processed
+    contexts in its own process-wide cache instead of processing them again in each operation.
+    """
     if not skip_cache:
-        response = cache.get("jsonld-loader-" + url)
+        response = _loaded_documents.get(url)
         if response is not None:
-            return json.loads(response)
+            return dict(response)
+
+        try:
+            with open(bundled_context_path(url), "r") as f:
+                response = json.load(f)
+        except FileNotFoundError:
+            cached = cache.get("jsonld-loader-" + url)
+            response = json.loads(cached) if cached is not None else None
+
+    if skip_cache or response is None:
+        response = _pyld_extended_loader(url, options)
+        cache.set("jsonld-loader-" + url, json.dumps(response), cache_time)
 
-    response = _pyld_extended_loader(url, options)
-    cache.set("jsonld-loader-" + url, json.dumps(response), cache_time)
-    return response
+    response["tag"] = "static"
+    with _loaded_documents_lock:
+        _loaded_documents[url] = response
+    return dict(response)
 
 
 def _pyld_extended_loader(url, options={}):
@@ -118,24 +173,78 @@ def _pyld_extended_loader(url, options={}):
             cause=cause)
 
 
+class ValueRewriter:
+    """
+    Replaces values in a JSON-like object (dict, list, etc.) in a single pass.
+
+    ids maps values to their replacement and is looked up for every string.
+    patterns maps regular expressions to replacements. The first pattern matching at the start of a string is
+    substituted in it, as with re.sub. Patterns are compiled into a single expression, so they cannot use
+    backreferences to their own groups.
+    Other values (numbers, booleans, None) are matched as strings, i.e. 1 is replaced by ids["1"], and only
+    converted to a string if they are replaced.
+
+    Objects and lists in which nothing is replaced are returned as they are, not copied.
+    """
+
+    def __init__(self, ids: Mapping[str, str] | None = None, patterns: Mapping[str, str] | None = None):
+        self._ids = dict(ids) if ids else {}
+        self._rules = [(re.compile(pattern), replacement) for pattern, replacement in (patterns or {}).items()]
+        self._combined_pattern = re.compile("|".join(f"(?P<_{i}>{pattern})" for i, pattern in enumerate(patterns or {}))) \
+            if self._rules else None
+
+    def rewrite(self, obj: dict[str, Any] | list[Any] | Any) -> dict[str, Any] | list[Any] | Any:
+        if isinstance(obj, str):
+            return self._rewrite_string(obj)
+        elif isinstance(obj, dict):
+            rewritten_dict = None
+            for key, value in obj.items():
+                rewritten = self.rewrite(value)
+                if rewritten is not value:
+                    if rewritten_dict is None:
+                        rewritten_dict = dict(obj)
+                    rewritten_dict[key] = rewritten
+            return obj if rewritten_dict is None else rewritten_dict
+        elif isinstance(obj, list):
+            rewritten_list = None
+            for i, item in enumerate(obj):
+                rewritten = self.rewrite(item)
+                if rewritten is not item:
+                    if rewritten_list is None:
+                        rewritten_list = list(obj)
+                    rewritten_list[i] = rewritten
+            return obj if rewritten_list is None else rewritten_list
+        value = str(obj)
+        rewritten_value = self._rewrite_string(value)
+        return obj if rewritten_value is value else rewritten_value
+
+    def _rewrite_string(self, value: str) -> str:
+        replacement = self._ids.get(value)
+        if replacement is not None:
+            return replacement
+        if self._combined_pattern is not None:
+            match = self._combined_pattern.match(value)
+            if match is not None:
+                rule_index = next(i for i in range(len(self._rules)) if match.group(f"_{i}") is not None)
+                pattern, replacement = self._rules[rule_index]
+                return pattern.sub(replacement, value)
+        return value
+
+
+@functools.lru_cache(maxsize=32)
+def _pattern_rewriter(patterns: tuple[tuple[str, str], ...]) -> ValueRewriter:
+    return ValueRewriter(patterns=dict(patterns))
+
+
 def replace_values(obj: dict[str, Any] | list[Any] | Any, replacements: dict[str, str]) -> dict[str, Any] | list[Any] | Any:
     """
     Recursively replaces values in a JSON-like object (dict, list, etc.)
-    based on a provided key-value mapping.
+    based on a provided mapping of regular expressions to replacements.
 
     The function traverses through the input object, which can be a dictionary,
-    list, or a primitive data type (string, integer, etc.). If a value in the object
-    matches a key in the provided `ids` mapping, it is replaced with the corresponding
-    value from the `ids` dictionary. The function handles nested structures, ensuring
-    that all values are checked and replaced if necessary.
+    list, or a primitive data type (string, integer, etc.). If a string in the object
+    matches a pattern of the `replacements` mapping, it is substituted with the corresponding
+    replacement. Objects and lists in which nothing is replaced are returned as they are.
+    Use a ValueRewriter with ids to replace exact values, i.e. identifiers.
     """
-    if isinstance(obj, dict):
-        return {k: replace_values(v, replacements) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [replace_values(item, replacements) for item in obj]
-    else:
-        for patten, replacement in replacements.items():
-            if re.match(patten, str(obj)):
-                return re.sub(patten, replacement, str(obj))
-
-    return obj
+    return _pattern_rewriter(tuple(replacements.items())).rewrite(obj)
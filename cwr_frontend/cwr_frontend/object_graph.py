@@ -0,0 +1,63 @@
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Any
+
+
+def get_types(obj: dict[str, Any]) -> list[str]:
+    """ Returns the @type of a JSON-LD object as list """
+    types = obj.get("@type", []) or []
+    if isinstance(types, str):
+        return [types]
+    return types
+
+
+def _ids(value: Any) -> list[str]:
+    """ Returns the ids a property links to, i.e. "id", ["id", ...] or [{"@id": "id"}, ...] """
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [item["@id"] if isinstance(item, dict) else item for item in value
+            if isinstance(item, str) or (isinstance(item, dict) and "@id" in item)]
+
+
+class ObjectGraph(Mapping[str, dict[str, Any]]):
+    """
+    Read-only map of the objects of a dataset graph {object_id: object}, as returned by CordraConnector.resolve_objects.
+
+    The graph is indexed once by @type, so lookups do not need to scan all objects.
+    Objects are not copied and must not be modified.
+    """
+
+    def __init__(self, objects: Mapping[str, dict[str, Any]]):
+        self._objects = objects
+        self._by_type: dict[str, list[str]] = {}
+        for object_id, obj in objects.items():
+            for type in get_types(obj):
+                self._by_type.setdefault(type, []).append(object_id)
+
+    @classmethod
+    def from_list(cls, objects: Iterable[dict[str, Any]]) -> "ObjectGraph":
+        """ Builds the graph from a list of objects, i.e. the @graph of a JSON-LD document. Objects without @id are skipped """
+        return cls({obj["@id"]: obj for obj in objects if "@id" in obj})
+
+    def __getitem__(self, object_id: str) -> dict[str, Any]:
+        return self._objects[object_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._objects)
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def get_all(self, object_ids: Any) -> list[dict[str, Any]]:
+        """ Returns the objects with the given ids (a single id or list of ids) in the given order. Missing ids are skipped """
+        return [self._objects[object_id] for object_id in _ids(object_ids) if object_id in self._objects]
+
+    def first_of_type(self, type: str) -> dict[str, Any] | None:
+        """ Returns the first object of the given @type or None """
+        object_ids = self._by_type.get(type)
+        return self._objects[object_ids[0]] if object_ids else None
+
+    def has_type(self, object_id: str, type: str) -> bool:
+        """ Returns if the object exists and has the given @type """
+        return object_id in self._objects and type in get_types(self._objects[object_id])
@@ -1,5 +1,8 @@
-from copy import deepcopy
+import os
+import uuid
+from collections.abc import Mapping
 from typing import Any
+from urllib.parse import quote, urljoin
 
 from rocrate.model import Person, ContextEntity
 
@@ -7,11 +10,13 @@ from cwr_frontend.jsonld_utils import pyld_caching_document_loader
 from pyld import jsonld
 from rocrate.rocrate import ROCrate
 from rocrate.model import RootDataset
-from cwr_frontend.jsonld_utils import replace_values
+from rocrate.utils import is_url, iso_now
+from cwr_frontend.jsonld_utils import ValueRewriter, replace_values
+from cwr_frontend.object_graph import ObjectGraph, get_types
 
 
 def _remove_children_from_objects(objects, child_id):
-    if child_id in objects and (objects[child_id]["@type"] == "Dataset" or (isinstance(objects[child_id]["@type"], list) and "Dataset" in objects[child_id]["@type"])):
+    if child_id in objects and "Dataset" in get_types(objects[child_id]):
         for grandchild_id in objects[child_id]["hasPart"]:
             _remove_children_from_objects(objects, grandchild_id)
     objects.pop(child_id, None)
@@ -33,9 +38,10 @@ def _filter_objects_for_workflow_crate(objects: dict[str, dict[str, Any]], datas
             objects.pop(mention, None)
     del objects[dataset_id]["mentions"]
 
-def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_urls: dict[str, str],
-                  with_preview: bool = False, detached: bool = False, workflow_only: bool = False) -> ROCrate:
-    objects = deepcopy(objects)  # make sure to not leak edits out of this method
+def _flatten_objects(dataset_id: str, objects: Mapping[str, dict[str, Any]], workflow_only: bool) -> list[dict[str, Any]]:
+    """ Returns the objects of a dataset flattened to the contexts of RO-Crate and Workflow Run RO-Crate """
+    # only the objects are copied, their values are not modified in place
+    objects_copy = {object_id: dict(object) for object_id, object in objects.items()}  # make sure to not leak edits out of this method
 
     # For all objects, we first want to flatten the JSONLD to the RO Crate context
     # This will remove our custom contexts and the type coercion
@@ -44,17 +50,25 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
 
     # add all objects to the crate.
     # flatten them to the appropriate context of RO-Crate and Workflow run RO Crates.
-    for object in objects.values():
+    for object in objects_copy.values():
         # hotfix for Cordra using https instead of http for schemas, while RO-Crates use http
         if "@context" in object:
-            object["@context"] = replace_values(object, {r"https://schema\.org(.*)": r"http://schema.org\1"})
+            # (the context is set to a copy of the object, replace_values returns unchanged objects as they are)
+            object["@context"] = replace_values(dict(object), {r"https://schema\.org(.*)": r"http://schema.org\1"})
 
     if workflow_only:
-        _filter_objects_for_workflow_crate(objects, dataset_id)
+        _filter_objects_for_workflow_crate(objects_copy, dataset_id)
 
     jsonld.set_document_loader(pyld_caching_document_loader)
-    flattened = jsonld.flatten(list(objects.values()), ["https://w3id.org/ro/crate/1.1/context",
+    flattened = jsonld.flatten(list(objects_copy.values()), ["https://w3id.org/ro/crate/1.1/context",
                                                         "https://www.researchobject.org/ro-terms/workflow-run/context.jsonld"])
+    return flattened["@graph"]
+
+
+def build_ROCrate(dataset_id: str, objects: Mapping[str, dict[str, Any]], remote_urls: dict[str, str],
+                  with_preview: bool = False, detached: bool = False, workflow_only: bool = False) -> ROCrate:
+    flattened_graph = _flatten_objects(dataset_id, objects, workflow_only)
+    flattened_objects = ObjectGraph.from_list(flattened_graph)
 
     id_map = {}  # map of CorA
     # map internal ids to created RO-Crate ids
@@ -73,7 +87,7 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
         # set sameAs on root dataset
         crate.root_dataset["sameAs"] = remote_urls[dataset_id]
 
-    for object in flattened["@graph"]:
+    for object in flattened_graph:
         # skip root entity
         if object["@id"] == dataset_id:
             continue
@@ -92,7 +106,7 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
 
             crate_obj = crate.add(Person(crate, identifier, object))
             id_map[cordra_id] = crate_obj.id
-        elif object["@type"] == "File" or (isinstance(object["@type"], list) and "File" in object["@type"]):
+        elif "File" in get_types(object):
             if detached:
                 dest_path = None
             else:
@@ -132,7 +146,8 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
             id_map[cordra_id] = crate_obj.id
 
     # Add attributes to root dataset entity
-    dataset = next(filter(lambda o: "@id" in o and o["@id"] == dataset_id, flattened["@graph"]))
+    id_rewriter = ValueRewriter(ids=id_map)
+    dataset = flattened_objects[dataset_id]
     for key, value in dataset.items():
         if key == "@context" or key == "@id" or key == "@type": 
             continue
@@ -145,7 +160,7 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
         else:
             if isinstance(value, dict) and "@value" in value:  # fix for https://github.com/ResearchObject/ro-crate-py/issues/190
                 value = value["@value"]
-            crate.root_dataset[key] = replace_values(value, id_map)
+            crate.root_dataset[key] = id_rewriter.rewrite(value)
 
     # nested crates don't always have a description (ModGP), so we use their name to make a valid crate
     if "description" not in crate.root_dataset:
@@ -156,7 +171,7 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
         for key in entity:
             if key in ["@type", "@id", "@context"]: 
                 continue
-            replaced = replace_values(entity.as_jsonld()[key], id_map)
+            replaced = id_rewriter.rewrite(entity.as_jsonld()[key])
             if replaced != entity[key]:
                 # The RO-Crate rewrited {"@id": xxx} to xxx if the id is not present in the crate yet.
                 # We undo that here when replacing internal ids with RO-Crate ids
@@ -186,4 +201,175 @@ def build_ROCrate(dataset_id: str, objects: dict[str, dict[str, Any]], remote_ur
                 }))
                 crate.root_dataset.append_to("conformsTo", profile_entity)
 
-    return crate
\ No newline at end of file
+    return crate
+
+def detached_metadata(dataset_id: str, objects: Mapping[str, dict[str, Any]], remote_urls: dict[str, str],
+                      workflow_only: bool = False) -> dict[str, Any]:
+    """
+    Returns the same metadata as build_ROCrate(..., detached=True).metadata.generate(), without building the crate.
+    The entities are created as plain dicts straight from the flattened objects, following the rules of ro-crate-py
+    used by build_ROCrate. Changes to build_ROCrate must be made here as well (see test_ro_crate).
+    """
+    if dataset_id not in remote_urls:
+        raise ValueError("Missing remote url for root dataset entity")
+
+    flattened_graph = _flatten_objects(dataset_id, objects, workflow_only)
+
+    metadata: dict[str, Any] = {
+        "@id": "ro-crate-metadata.json",
+        "@type": "CreativeWork",
+        "conformsTo": [{"@id": "https://w3id.org/ro/crate/1.2-DRAFT"}],
+        "about": {"@id": _dataset_id(remote_urls[dataset_id])},
+    }
+    root: dict[str, Any] = {"@id": _dataset_id(remote_urls[dataset_id]), "@type": "Dataset", "datePublished": iso_now()}
+    # entities by canonical id, in the order of the crate
+    entities = {_canonical_id(metadata["@id"]): metadata, _canonical_id(root["@id"]): root}
+
+    def add(entity: dict[str, Any], data_entity: bool = False):
+        key = _canonical_id(entity["@id"])
+        if data_entity and key not in entities:
+            _append_to(root, "hasPart", {"@id": entity["@id"]})
+        entities[key] = entity
+
+    id_map = {}
+    dataset = None
+    for object in flattened_graph:
+        if object["@id"] == dataset_id:
+            dataset = object
+            continue
+
+        cordra_id = object.pop("@id")
+        remote_url = remote_urls.get(cordra_id, None)
+
+        if object["@type"] == "Person":
+            identifier = object.pop("identifier") if "identifier" in object else cordra_id
+            entity = _entity(identifier, "Person", object)
+            add(entity)
+        elif "File" in get_types(object):
+            for key in ["contentUrl", "isPartOf", "partOf", "resultOf"]:
+                object.pop(key, None)
+            entity = _entity(_data_entity_id(remote_url), "File", object)
+            add(entity, data_entity=True)
+        elif object["@type"] == "Dataset":
+            for key, value in object.items():
+                if isinstance(value, dict) and "@value" in value:
+                    object[key] = value["@value"]
+            for key in ["contentUrl", "isPartOf", "partOf", "resultOf"]:
+                object.pop(key, None)
+            if remote_url and not remote_url.endswith("/"):
+                remote_url += "/"
+            entity = _entity(_data_entity_id(remote_url), "File", object)
+            add(entity, data_entity=True)
+            _append_to(entity, "conformsTo", {"@id": "https://w3id.org/ro/crate"})
+        else:
+            identifier = object.pop("identifier") if "identifier" in object else f"#{cordra_id}"
+            entity = _entity(identifier, "Thing", object)
+            add(entity)
+        id_map[cordra_id] = entity["@id"]
+
+    if dataset is None:
+        raise KeyError(dataset_id)
+
+    # Add attributes to root dataset entity
+    id_rewriter = ValueRewriter(ids=id_map)
+    for key, value in dataset.items():
+        if key == "@context" or key == "@id" or key == "@type":
+            continue
+        if key == "isPartOf":
+            parent_dataset = _entity(_dataset_id(_data_entity_id(remote_urls[value["@id"]])), "Dataset", {})
+            add(parent_dataset, data_entity=True)
+            parent_dataset["conformsTo"] = {"@id": "https://w3id.org/ro/crate"}
+            root["isPartOf"] = {"@id": parent_dataset["@id"]}
+            root["hasPart"] = [part for part in root.get("hasPart", []) if part["@id"] != parent_dataset["@id"]]
+        else:
+            if isinstance(value, dict) and "@value" in value:
+                value = value["@value"]
+            _set_property(root, key, id_rewriter.rewrite(value))
+
+    if "description" not in root:
+        _set_property(root, "description", root["name"])
+
+    # Replace corda IDs with RO-Crate IDs
+    for entity in entities.values():
+        for key in entity:
+            if key in ["@type", "@id", "@context"]:
+                continue
+            value = entity[key]
+            replaced = id_rewriter.rewrite(value)
+            # references are always rewritten by build_ROCrate, since ro-crate-py returns them as entities
+            is_reference = isinstance(value, dict) or (isinstance(value, list) and any(isinstance(v, dict) for v in value))
+            if is_reference or replaced != value:
+                if isinstance(replaced, str):
+                    replaced = {"@id": replaced}
+                elif isinstance(replaced, list) and len(replaced) > 0 and "@id" not in replaced[0]:
+                    replaced = [{"@id": entity_id} for entity_id in replaced]
+            _set_property(entity, key, replaced)
+
+    # make this a valid 1.2-DRAFT RO-Crate
+    context: list[str] | str = "https://w3id.org/ro/crate/1.2-DRAFT/context"
+    if "mainEntity" in root:
+        # make this a valid Workflow RO-Crate
+        context = ["https://w3id.org/ro/crate/1.2-DRAFT/context", "https://w3id.org/ro/terms/workflow-run/context"]
+        metadata["conformsTo"] = [
+            {"@id": "https://w3id.org/ro/crate/1.2-DRAFT"},
+            {"@id": "https://w3id.org/workflowhub/workflow-ro-crate/1.0"}
+        ]
+        if "mentions" in root:
+            # make this a valid Workflow Run RO-Crate
+            for profile in ["https://w3id.org/ro/wfrun/process/0.5", "https://w3id.org/ro/wfrun/workflow/0.5", "https://w3id.org/workflowhub/workflow-ro-crate/1.0"]:
+                add({"@id": profile, "@type": "CreativeWork", "version": profile.split("/")[-1]})
+                _append_to(root, "conformsTo", {"@id": profile})
+
+    return {"@context": context, "@graph": list(entities.values())}
+
+
+# base of ids that are not urls, only used to find entities with the same id like ro-crate-py does
+_ARCP_BASE_URI = "arcp://uuid,00000000-0000-0000-0000-000000000000/"
+
+
+def _canonical_id(entity_id: str) -> str:
+    if not is_url(entity_id):
+        entity_id = urljoin(_ARCP_BASE_URI, entity_id)
+    return entity_id.rstrip("/")
+
+
+def _entity(identifier: Any, default_type: str, properties: dict[str, Any]) -> dict[str, Any]:
+    """ Creates an entity like the constructor of a ro-crate-py entity """
+    entity = {"@id": str(identifier) if identifier else f"#{uuid.uuid4()}", "@type": default_type}
+    for key, value in properties.items():
+        if key.startswith("@"):
+            entity[key] = value
+        else:
+            _set_property(entity, key, value)
+    return entity
+
+
+def _data_entity_id(source: str | None) -> str:
+    """ Id of a file or dataset added to the crate without dest_path """
+    if not isinstance(source, str):
+        raise ValueError("dest_path must be provided if source is not a path or URI")
+    return source if is_url(source) else quote(os.path.basename(source.rstrip("/")))
+
+
+def _dataset_id(identifier: str) -> str:
+    return identifier.rstrip("/") + "/"
+
+
+def _set_property(entity: dict[str, Any], key: str, value: Any):
+    """ Sets a property like ro-crate-py, which unwraps value objects and only allows references as objects """
+    values = value if isinstance(value, list) else [value]
+    ref_values = []
+    for v in values:
+        if isinstance(v, dict) and "@id" not in v:
+            if "@value" not in v:
+                raise ValueError(f"no @id in {v}")
+            v = v["@value"]
+        ref_values.append(v)
+    entity[key] = ref_values if isinstance(value, list) else ref_values[0]
+
+
+def _append_to(entity: dict[str, Any], key: str, value: Any):
+    current_value = entity.setdefault(key, [])
+    if not isinstance(current_value, list):
+        current_value = entity[key] = [current_value]
+    current_value.append(value)
@@ -1,105 +1,69 @@
-import io
-import ssl
-import tempfile
-import zipfile
-from typing import Any
+import hashlib
+from typing import Any, Callable
 
-import django
-import requests
 import yaml
-from yaml.scanner import ScannerError
-from django.core.exceptions import ValidationError
 from django.http import HttpResponseBase, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from rocrate.rocrate import ROCrate
 
+from cwr_frontend.archive_store import archive_response, get_archive_store
+from cwr_frontend.caching import shared_cache
 from cwr_frontend.cordra.CordraConnector import CordraConnector
-from cwr_frontend.rocrate_builder import build_ROCrate
+from cwr_frontend.object_graph import ObjectGraph
+from cwr_frontend.rocrate_builder import build_ROCrate, detached_metadata
+from cwr_frontend.rocrate_zip import COMPRESSION_MODES, compression_mode, stream_zip
 
 
-def get_crate_workflow_from_zip(file) -> tuple[ROCrate, dict[str, Any]]:
-        # check if this is a zip file
-        if (file.content_type not in ['application/zip', 'application/octet-stream']):
-            raise ValidationError("File is not a zip file")
-
-        # assert zip file is valid
-        try:
-            bytes = io.BytesIO(file.read())
-            zipfile.ZipFile(bytes)
-            file.seek(0)
-        except zipfile.BadZipFile:
-            file.close()
-            raise ValidationError("File is not a zip file")
-
-        # Parse RO crate and extract workflow
-        with file as f:
-            # parse ro-crate and find workflow file
-            with tempfile.NamedTemporaryFile(delete=True) as tmp:
-                if isinstance(f, django.core.files.base.File):
-                    # django file object
-                    chunks = f.chunks()
-                else:
-                    # object is http request
-                    chunks = f.iter_content(chunk_size=8192)
-
-                for chunk in chunks:
-                    tmp.write(chunk)
-                tmp.flush()
-
-                crate = ROCrate(tmp.name)
-                workflow_path = crate.source / crate.root_dataset["mainEntity"].id
-
-                # check workflow file and set it to the session
-                if workflow_path.exists():
-                    try:
-                        workflow = yaml.load(open(workflow_path, "r"), Loader=yaml.CLoader)
-                    except ScannerError as e:
-                        raise ValidationError(f"Workflow file corrupted: {e.problem} {e.context}")
-
-                else:
-                    raise ValidationError("Workflow file not found in RO-Crate")
-                
-                # check if license is defined
-                if "license" not in crate.root_dataset:
-                    raise ValidationError("License not defined in RO-Crate")
-
-                return crate, workflow
-            
-def get_crate_workflow_from_id(request, crate_id):
-    crate_url = request.build_absolute_uri(reverse("dataset_detail", kwargs={"id": crate_id}))
-    crate_url += "?format=ROCrate"
-    response = requests.get(crate_url, stream=True, verify=False)
-    response.raise_for_status()
-    with tempfile.TemporaryDirectory(delete=True) as tmp_dir:
-        file = open(tmp_dir + "/ro-crate-metadata.json", "wb")
-        for chunk in response.iter_content(chunk_size=8192):
-            file.write(chunk)
-        file.flush()
-
-        crate = ROCrate(source=tmp_dir)
-        workflow_url = crate.root_dataset["mainEntity"].id
-        workflow_response = requests.get(workflow_url, verify=False)
-        workflow_response.raise_for_status()
-        workflow = yaml.load(workflow_response.content, Loader=yaml.CLoader)
-        return crate, workflow
+def get_crate_workflow_from_id(request, crate_id: str, connector: CordraConnector) -> tuple[ROCrate, dict[str, Any]]:
+    """ Returns the detached RO-Crate of a dataset and its workflow (the mainEntity of the dataset).
+    The crate is built from the resolved object graph, like the metadata returned by as_ROCrate,
+    and the workflow file is fetched from cordra.
+    """
+    objects = ObjectGraph(connector.resolve_objects(crate_id, nested=True))
+    crate = _build_ROCrate(connector, request.build_absolute_uri, crate_id, objects, with_preview=False, detached=True)
+
+    workflow_objects = objects.get_all(objects[crate_id].get("mainEntity"))
+    if not workflow_objects or "contentUrl" not in workflow_objects[0]:
+        raise ValueError(f"No workflow file found in {crate_id}")
+    workflow_object = workflow_objects[0]
+    workflow = yaml.load(connector.get_payload(workflow_object["@id"], workflow_object["contentUrl"]), Loader=yaml.CLoader)
+    return crate, workflow
+
+def _build_ROCrate(connector, build_absolute_uri: Callable[[str], str], dataset_id: str, objects: ObjectGraph, with_preview: bool, detached: bool, workflow_only=False) -> ROCrate:
+    remote_urls = _remote_urls(connector, build_absolute_uri, objects)
+    crate = build_ROCrate(dataset_id, objects, remote_urls=remote_urls, with_preview=with_preview, detached=detached, workflow_only=workflow_only)
+    return crate
 
-def _build_ROCrate(connector, request, dataset_id: str, objects: dict[str, dict[str, Any]], with_preview: bool, detached: bool, workflow_only=False) -> ROCrate:
+def _remote_urls(connector, build_absolute_uri: Callable[[str], str], objects: ObjectGraph) -> dict[str, str]:
     remote_urls = {}
-    for cordra_id in objects:
-        if "contentUrl" in objects[cordra_id]:
-            url = request.build_absolute_uri(connector.get_object_abs_url(cordra_id, objects[cordra_id]["contentUrl"]))
+    for cordra_id, obj in objects.items():
+        if "contentUrl" in obj:
+            url = build_absolute_uri(connector.get_object_abs_url(cordra_id, obj["contentUrl"]))
             remote_urls[cordra_id] = url
-        elif "identifier" in objects[cordra_id]:
-            url = request.build_absolute_uri(connector.get_object_abs_url(cordra_id))
+        elif "identifier" in obj:
+            url = build_absolute_uri(connector.get_object_abs_url(cordra_id))
             remote_urls[cordra_id] = url
-        elif "Dataset" in objects[cordra_id]["@type"]:
-            url = request.build_absolute_uri(reverse("dataset_detail", args=[cordra_id]))
+        elif objects.has_type(cordra_id, "Dataset"):
+            url = build_absolute_uri(reverse("dataset_detail", args=[cordra_id]))
             remote_urls[cordra_id] = url
-            if "isPartOf" in objects[cordra_id]:
-                for parent_id in objects[cordra_id]["isPartOf"]:
-                    remote_urls[parent_id] = request.build_absolute_uri(reverse("dataset_detail", args=[parent_id]))
-    crate = build_ROCrate(dataset_id, objects, remote_urls=remote_urls, with_preview=with_preview, detached=detached, workflow_only=workflow_only)
-    return crate
+            if "isPartOf" in obj:
+                for parent_id in obj["isPartOf"]:
+                    remote_urls[parent_id] = build_absolute_uri(reverse("dataset_detail", args=[parent_id]))
+    return remote_urls
+
+def crate_metadata(connector: CordraConnector, build_absolute_uri: Callable[[str], str], id: str, workflow_only=False, nested=False) -> dict[str, Any]:
+    """ Returns the metadata of the detached RO-Crate of a dataset.
+    Results are cached per version of the dataset graph and base url.
+    """
+    objects, graph_version = connector.resolve_objects_versioned(id, nested=nested, workflow_only=workflow_only)
+    base_url = build_absolute_uri("/")
+    cache_key = f"rocrate-metadata-{id}-nested={nested}-workflow_only={workflow_only}-{graph_version}-{hashlib.sha1(base_url.encode('utf-8')).hexdigest()}"
+    metadata = shared_cache.get(cache_key)
+    if metadata is None:
+        remote_urls = _remote_urls(connector, build_absolute_uri, ObjectGraph(objects))
+        metadata = detached_metadata(id, objects, remote_urls, workflow_only=workflow_only)
+        shared_cache.set(cache_key, metadata, 60 * 60 * 24)
+    return metadata
 
 def as_ROCrate(request, id: str, download: bool, connector: CordraConnector, workflow_only=False, nested=False) -> HttpResponseBase:
     """ return a downloadable zip in RO-Crate format from the given dataset entity
@@ -110,20 +74,37 @@ def as_ROCrate(request, id: str, download: bool, connector: CordraConnector, wor
         objects - list of digital objects of the dataset
         download - return a downloadable zip in RO-Crate format
         connector - CordraConnector
-    """
-    objects = connector.resolve_objects(id, nested=nested, workflow_only=workflow_only)
-    crate = _build_ROCrate(connector, request, id, objects, with_preview=download, detached=not download, workflow_only=workflow_only)
 
+    The compression of the zip can be chosen with the compression query parameter (see rocrate_zip.COMPRESSION_MODES).
+    If an archive store is configured, built archives are stored and served from it until the dataset is modified.
+    """
     if not download:
         # return just the metadata
-        return JsonResponse(crate.metadata.generate())
+        return JsonResponse(crate_metadata(connector, request.build_absolute_uri, id, workflow_only=workflow_only, nested=nested))
     else:
-        try:
-            ssl._create_default_https_context = ssl._create_unverified_context # type: ignore
-            archive_name = f'{"_".join(id.split("/")[1:])}.zip'
-            response = StreamingHttpResponse(crate.stream_zip(), content_type="application/zip")
-            response["Content-Disposition"] = f"attachment; filename={archive_name}"
-            return response
-        finally:
-            # restore default ssl context
-            ssl._create_default_https_context = ssl._create_default_https_context
\ No newline at end of file
+        archive_name = f'{"_".join(id.split("/")[1:])}.zip'
+        compression = request.GET.get("compression")
+        compression = compression_mode(compression if compression in COMPRESSION_MODES else None)
+
+        # serve archives of unmodified datasets from the archive store
+        archive_store = get_archive_store()
+        archive_key = None
+        if archive_store is not None:
+            modified_on = connector.get_modified_on(id)
+            if modified_on is not None:
+                archive_key = archive_store.key(id, modified_on, nested=nested, workflow_only=workflow_only,
+                                                compression=compression, base_url=request.build_absolute_uri("/"))
+                archive = archive_store.get(archive_key)
+                if archive is not None:
+                    archive_file, archive_size = archive
+                    return archive_response(request, archive_file, archive_size, archive_key, archive_name)
+
+        objects = ObjectGraph(connector.resolve_objects(id, nested=nested, workflow_only=workflow_only))
+        crate = _build_ROCrate(connector, request.build_absolute_uri, id, objects, with_preview=True, detached=False, workflow_only=workflow_only)
+        # payloads are fetched with the TLS settings of the payload fetcher (see ROCRATE_DOWNLOAD in the settings)
+        chunks = stream_zip(crate, compression=compression)
+        if archive_store is not None and archive_key is not None:
+            chunks = archive_store.store(archive_key, chunks)
+        response = StreamingHttpResponse(chunks, content_type="application/zip")
+        response["Content-Disposition"] = f"attachment; filename={archive_name}"
+        return response
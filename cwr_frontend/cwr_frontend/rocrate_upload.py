@@ -0,0 +1,100 @@
+import json
+import tempfile
+import zipfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import IO, Any
+
+import yaml
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from rocrate.rocrate import ROCrate
+from rocrate.utils import is_url
+from yaml.scanner import ScannerError
+
+# names of the metadata file, the legacy one is still read by ro-crate-py
+_METADATA_MEMBERS = ("ro-crate-metadata.json", "ro-crate-metadata.jsonld")
+
+
+@contextmanager
+def _seekable(file) -> Iterator[str | IO[bytes] | File]:
+    """
+    Yields the path or file object to read a zip file from.
+    Uploads that django wrote to disk are read from their temporary file and uploads held in memory are read as they are.
+    Other files (i.e. http responses) are written to a temporary file once.
+    """
+    if hasattr(file, "temporary_file_path"):
+        yield file.temporary_file_path()
+    elif isinstance(file, File) and file.seekable():
+        file.seek(0)
+        yield file
+    else:
+        with tempfile.NamedTemporaryFile() as tmp:
+            chunks = file.chunks() if isinstance(file, File) else file.iter_content(chunk_size=8192)
+            for chunk in chunks:
+                tmp.write(chunk)
+            tmp.flush()
+            yield tmp.name
+
+
+def _read_member(archive: zipfile.ZipFile, name: str) -> bytes | None:
+    try:
+        return archive.read(name)
+    except KeyError:
+        return None
+
+
+def read_crate_workflow(archive: zipfile.ZipFile) -> tuple[ROCrate, dict[str, Any]]:
+    """
+    Reads the metadata and the workflow (the mainEntity) of a zipped RO-Crate.
+    Only these two files are extracted, the other files of the crate are not read.
+    """
+    metadata = None
+    for name in _METADATA_MEMBERS:
+        metadata = _read_member(archive, name)
+        if metadata is not None:
+            break
+    if metadata is None:
+        raise ValidationError("Not a valid RO-Crate: missing ro-crate-metadata.json")
+    try:
+        crate = ROCrate(source=json.loads(metadata))
+    except (ValueError, KeyError) as e:
+        raise ValidationError(f"Not a valid RO-Crate: {e}")
+
+    # find and parse the workflow file
+    main_entity = crate.root_dataset.get("mainEntity")
+    # references to entities missing in the metadata are not dereferenced
+    workflow_id = main_entity.get("@id") if isinstance(main_entity, dict) else getattr(main_entity, "id", main_entity)
+    workflow_file = None
+    if isinstance(workflow_id, str) and not is_url(workflow_id):
+        workflow_file = _read_member(archive, workflow_id)
+    if workflow_file is None:
+        raise ValidationError("Workflow file not found in RO-Crate")
+    try:
+        workflow = yaml.load(workflow_file, Loader=yaml.CLoader)
+    except ScannerError as e:
+        raise ValidationError(f"Workflow file corrupted: {e.problem} {e.context}")
+
+    # check if license is defined
+    if "license" not in crate.root_dataset:
+        raise ValidationError("License not defined in RO-Crate")
+
+    return crate, workflow
+
+
+def get_crate_workflow_from_zip(file) -> tuple[ROCrate, dict[str, Any]]:
+    """
+    Parses an uploaded RO-Crate zip file and returns the crate and its workflow.
+    The upload is not read into memory and not extracted, only the central directory of the zip file, the metadata
+    and the workflow are read.
+    """
+    # check if this is a zip file
+    if (file.content_type not in ['application/zip', 'application/octet-stream']):
+        raise ValidationError("File is not a zip file")
+
+    with file as f, _seekable(f) as source:
+        try:
+            with zipfile.ZipFile(source) as archive:
+                return read_crate_workflow(archive)
+        except zipfile.BadZipFile:
+            raise ValidationError("File is not a zip file")
@@ -0,0 +1,249 @@
+import mimetypes
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO, StringIO
+from typing import IO
+
+from django.conf import settings
+from rocrate.memory_buffer import MemoryBuffer
+from rocrate.model import File
+from rocrate.rocrate import ROCrate
+from rocrate.utils import is_url
+
+from cwr_frontend.http_session import PooledSession, get_pooled_session
+
+DEFAULT_PREFETCH_WORKERS = 4
+DEFAULT_PREFETCH_PAYLOADS = 8
+DEFAULT_PREFETCH_MEMORY = 64 * 1024 * 1024
+
+# "auto" compresses files depending on their format and size (see compression_for), "deflate" compresses all files
+# and "store" none of them, i.e. for fast local mirrors
+COMPRESSION_MODES = ("auto", "deflate", "store")
+DEFAULT_COMPRESSION_SIZE_THRESHOLD = 16 * 1024 * 1024
+
+# formats that are compressed already
+_INCOMPRESSIBLE_FORMATS = {
+    "application/gzip", "application/x-gzip", "application/zip", "application/x-zip-compressed", "application/x-bzip2",
+    "application/x-xz", "application/x-7z-compressed", "application/x-rar-compressed", "application/zstd",
+    "application/x-netcdf", "application/netcdf", "application/x-hdf5", "application/x-hdf", "application/pdf",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/x-parquet", "application/vnd.apache.parquet",
+}
+_INCOMPRESSIBLE_FORMAT_PREFIXES = ("image/", "video/", "audio/")
+# uncompressed images
+_COMPRESSIBLE_IMAGE_FORMATS = {"image/svg+xml", "image/bmp", "image/x-ms-bmp", "image/x-portable-pixmap"}
+_COMPRESSIBLE_FORMATS = {
+    "application/json", "application/ld+json", "application/xml", "application/yaml", "application/x-yaml",
+    "application/javascript", "application/sql", "application/x-sh", "application/x-python",
+}
+
+
+class PrefetchClosed(Exception):
+    pass
+
+
+class PayloadPrefetcher:
+    """
+    Fetches payloads concurrently ahead of their consumer, which gets them in the given order.
+
+    At most max_payloads payloads are fetched ahead by up to workers threads. Each payload is written to a spool file,
+    which is kept in memory up to its share of max_memory and rolled over to disk otherwise.
+    Closing the prefetcher (i.e. when the client disconnected) stops fetching at the next chunk and removes spooled payloads.
+    """
+
+    def __init__(self, urls: Sequence[str], fetch: Callable[[str], Iterable[bytes]], workers: int = DEFAULT_PREFETCH_WORKERS,
+                 max_payloads: int = DEFAULT_PREFETCH_PAYLOADS, max_memory: int = DEFAULT_PREFETCH_MEMORY):
+        self._urls = urls
+        self._fetch = fetch
+        self._max_payloads = max(max_payloads, 1)
+        # the payload being consumed is held in addition to the ones fetched ahead
+        self._spool_size = max_memory // (self._max_payloads + 1)
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="payload-prefetch")
+        self._futures: deque[Future[IO[bytes]]] = deque()
+        self._next_index = 0
+        self._closed = threading.Event()
+
+    def __iter__(self) -> Generator[tuple[str, IO[bytes]], None, None]:
+        """ Yields url and spooled payload. A payload is closed when the next one is requested. """
+        try:
+            self._submit()
+            while self._futures:
+                url_index = self._next_index - len(self._futures)
+                payload = self._futures.popleft().result()
+                self._submit()
+                try:
+                    yield self._urls[url_index], payload
+                finally:
+                    payload.close()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        while self._futures:
+            future = self._futures.popleft()
+            if future.done() and not future.cancelled() and future.exception() is None:
+                future.result().close()
+
+    def _submit(self):
+        while self._next_index < len(self._urls) and len(self._futures) < self._max_payloads:
+            self._futures.append(self._executor.submit(self._fetch_payload, self._urls[self._next_index]))
+            self._next_index += 1
+
+    def _fetch_payload(self, url: str) -> IO[bytes]:
+        spool = tempfile.SpooledTemporaryFile(max_size=self._spool_size)
+        try:
+            for chunk in self._fetch(url):
+                if self._closed.is_set():
+                    raise PrefetchClosed(url)
+                spool.write(chunk)
+            if self._closed.is_set():
+                raise PrefetchClosed(url)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+
+class PayloadFetcher:
+    """
+    Fetches the payloads of remote files of a crate.
+
+    ro-crate-py fetches them with urllib, which depends on the process-wide default SSL context. The fetcher uses its own
+    pool of keep-alive connections instead, with its own TLS settings. The pool is shared by all threads of a worker
+    process, so concurrent downloads do not affect each other.
+    """
+
+    def __init__(self, session: PooledSession):
+        self._http = session
+
+    @classmethod
+    def from_settings(cls) -> "PayloadFetcher":
+        download_settings = getattr(settings, "ROCRATE_DOWNLOAD", {})
+        return cls(get_pooled_session(
+            "payloads",
+            pool_size=download_settings.get("POOL_SIZE", 20),
+            timeout=download_settings.get("FETCH_TIMEOUT", 60),
+            verify=download_settings.get("VERIFY_TLS", False),
+        ))
+
+    def fetch(self, url: str, chunk_size: int = 8192) -> Iterator[bytes]:
+        with self._http.get(url, endpoint="payloads", stream=True) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=chunk_size)
+
+
+def _is_remote(entity) -> bool:
+    """ Whether ro-crate-py would fetch the content of the entity from its url when streaming the crate """
+    return isinstance(entity, File) and entity.fetch_remote and not entity.validate_url \
+        and not isinstance(entity.source, (BytesIO, StringIO)) and is_url(str(entity.source))
+
+
+def compression_for(entity, mode: str = "auto", size_threshold: int = DEFAULT_COMPRESSION_SIZE_THRESHOLD) -> int:
+    """
+    Returns the zip compression of a file of the crate.
+    In auto mode, files are deflated unless their encodingFormat (or the type guessed from their name) is compressed
+    already, i.e. images and archives. Files of other formats larger than size_threshold are stored.
+    """
+    if mode == "store":
+        return zipfile.ZIP_STORED
+    if mode == "deflate":
+        return zipfile.ZIP_DEFLATED
+
+    encoding_formats = entity.get("encodingFormat") or mimetypes.guess_type(entity.id)[0]
+    if not isinstance(encoding_formats, list):
+        encoding_formats = [encoding_formats]
+    for encoding_format in encoding_formats:
+        if not isinstance(encoding_format, str):
+            continue
+        encoding_format = encoding_format.split(";")[0].strip().lower()
+        if encoding_format.startswith("text/") or encoding_format.endswith(("+json", "+xml")) \
+                or encoding_format in _COMPRESSIBLE_FORMATS or encoding_format in _COMPRESSIBLE_IMAGE_FORMATS:
+            return zipfile.ZIP_DEFLATED
+        if encoding_format in _INCOMPRESSIBLE_FORMATS or encoding_format.startswith(_INCOMPRESSIBLE_FORMAT_PREFIXES):
+            return zipfile.ZIP_STORED
+
+    try:
+        size = int(entity.get("contentSize", 0))
+    except (TypeError, ValueError):
+        size = 0
+    return zipfile.ZIP_STORED if size > size_threshold else zipfile.ZIP_DEFLATED
+
+
+def compression_mode(compression: str | None = None) -> str:
+    """ Returns the given compression mode, or the configured one if none is given """
+    compression = compression or getattr(settings, "ROCRATE_DOWNLOAD", {}).get("COMPRESSION", "auto")
+    if compression not in COMPRESSION_MODES:
+        raise ValueError(f"Unknown compression mode {compression}")
+    return compression
+
+
+def stream_zip(crate: ROCrate, chunk_size: int = 8192, compression: str | None = None,
+               fetcher: PayloadFetcher | None = None) -> Iterator[bytes]:
+    """
+    Stream of bytes of the RO-Crate as a ZIP file, like crate.stream_zip() for crates built in memory.
+    Remote files are fetched ahead of the stream by a PayloadPrefetcher (see ROCRATE_DOWNLOAD in the settings),
+    using the given fetcher or the one configured in the settings.
+    Files are compressed following compression_for in the given mode, which defaults to ROCRATE_DOWNLOAD["COMPRESSION"].
+    """
+    download_settings = getattr(settings, "ROCRATE_DOWNLOAD", {})
+    compression = compression_mode(compression)
+    size_threshold = download_settings.get("COMPRESSION_SIZE_THRESHOLD", DEFAULT_COMPRESSION_SIZE_THRESHOLD)
+
+    def open_file(archive: zipfile.ZipFile, path: str, entity) -> IO[bytes]:
+        file_info = zipfile.ZipInfo(path, date_time=time.localtime(time.time())[:6])
+        file_info.compress_type = compression_for(entity, compression, size_threshold)
+        return archive.open(file_info, mode="w", force_zip64=True)
+
+    payload_fetcher = fetcher or PayloadFetcher.from_settings()
+    entities = crate.data_entities + crate.default_entities
+    prefetcher = PayloadPrefetcher(
+        [str(entity.source) for entity in entities if _is_remote(entity)],
+        fetch=lambda url: payload_fetcher.fetch(url, chunk_size),
+        workers=download_settings.get("PREFETCH_WORKERS", DEFAULT_PREFETCH_WORKERS),
+        max_payloads=download_settings.get("PREFETCH_PAYLOADS", DEFAULT_PREFETCH_PAYLOADS),
+        max_memory=download_settings.get("PREFETCH_MEMORY", DEFAULT_PREFETCH_MEMORY),
+    )
+    payloads = iter(prefetcher)
+    try:
+        with MemoryBuffer() as buffer:
+            with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for entity in entities:
+                    if _is_remote(entity):
+                        url, payload = next(payloads)
+                        # ro-crate-py records the url of fetched files
+                        entity["contentUrl"] = url
+                        with open_file(archive, entity.id, entity) as out_file:
+                            while chunk := payload.read(chunk_size):
+                                out_file.write(chunk)
+                                while len(buffer) >= chunk_size:
+                                    yield buffer.read(chunk_size)
+                        continue
+
+                    current_file_path, current_out_file = None, None
+                    for path, chunk in entity.stream(chunk_size=chunk_size):
+                        if current_out_file is None or path != current_file_path:
+                            if current_out_file:
+                                current_out_file.close()
+                            current_file_path = path
+                            current_out_file = open_file(archive, path, entity)
+                        current_out_file.write(chunk)
+                        while len(buffer) >= chunk_size:
+                            yield buffer.read(chunk_size)
+                    if current_out_file:
+                        current_out_file.close()
+
+            while chunk := buffer.read(chunk_size):
+                yield chunk
+    finally:
+        # stops prefetching if the stream is closed early, i.e. when the client disconnected
+        payloads.close()
+        prefetcher.close()
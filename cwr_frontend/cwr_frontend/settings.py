@@ -51,14 +51,30 @@ CORDRA = {
     "PREFIX": env("CORDRA_PREFIX", default="cwr/"),
     "USER": env("CORDRA_USER", default=None),
     "PASSWORD": env("CORDRA_PASSWORD", default=None),
+    # connection pool per worker process, shared by all threads
+    "POOL_SIZE": env.int("CORDRA_POOL_SIZE", default=10),
+    "TIMEOUT": env.float("CORDRA_TIMEOUT", default=30),
+    "GRAPH_TIMEOUT": env.float("CORDRA_GRAPH_TIMEOUT", default=120),
+    "RETRIES": env.int("CORDRA_RETRIES", default=3),
 }
 
 WORKFLOW_SERVICE = {
     "URL": env("WORKFLOW_SERVICE_URL", default="http://localhost:8001"),
     "USER": env("WORKFLOW_SERVICE_USER", default="test"),
     "PASSWORD": env("WORKFLOW_SERVICE_PASSWORD", default="test"),
+    # connection pool per worker process, shared by all threads
+    "POOL_SIZE": env.int("WORKFLOW_SERVICE_POOL_SIZE", default=5),
+    "TIMEOUT": env.float("WORKFLOW_SERVICE_TIMEOUT", default=60),
+    "RETRIES": env.int("WORKFLOW_SERVICE_RETRIES", default=2),
+    # part of the cache keys of workflow checks, change it when the workflow service is updated to check workflows again
+    "VERSION": env("WORKFLOW_SERVICE_VERSION", default=""),
 }
+# graphs of workflows are built by the workflow service ("service"), in process ("local"),
+# or by the workflow service with the local engine as fallback if the service is unavailable ("auto")
+WORKFLOW_GRAPH_ENGINE = env("WORKFLOW_GRAPH_ENGINE", default="auto")
 ARGO_URL = env("ARGO_URL", default="http://example.com")
+# scheme and host the frontend is served at. Used to build absolute urls outside of requests, i.e. in management commands
+SITE_URL = env("SITE_URL", default=None)
 PROJECT_NAME = env("PROJECT_NAME", default="FAIR Workflow Platform")
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -178,18 +194,75 @@ if DEBUG:
     CACHES = {
         "default": {
             "BACKEND": "django.core.cache.backends.dummy.DummyCache",
-        }
+        },
+        "shared": {
+            "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        },
     }
+    LOCAL_CACHE_MAX_SIZE = 0
 else:
     CACHES = {
         "default": {
             "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
             "LOCATION": "unique-snowflake",
             "TIMEOUT": 300,
-        }
+        },
+        # cache shared by all worker processes, i.e. for resolved object graphs
+        "shared": {
+            "BACKEND": "cwr_frontend.caching.SizeBoundedFileBasedCache",
+            "LOCATION": env("SHARED_CACHE_DIR", default=BASE_DIR / "cache"),
+            "TIMEOUT": 60 * 60,
+            "OPTIONS": {
+                "MAX_ENTRIES": 10000,
+                "MAX_SIZE": env.int("SHARED_CACHE_MAX_SIZE", default=1024 * 1024 * 1024),
+            },
+        },
     }
+    # size of the in-process cache in front of the shared cache
+    LOCAL_CACHE_MAX_SIZE = env.int("LOCAL_CACHE_MAX_SIZE", default=64 * 1024 * 1024)
     # Do not send cache-control headers for pages
     CACHE_MIDDLEWARE_SECONDS = 0
+LOCAL_CACHE_TIMEOUT = 60
+
+# resolved object graphs are fresh for TIMEOUT seconds. Afterwards, they are served for up to MAX_STALE seconds
+# while being revalidated in the background against the modification time of the dataset.
+# If LOCK_DIR is set, only one worker process refreshes a graph at a time.
+GRAPH_CACHE = {
+    "TIMEOUT": env.int("GRAPH_CACHE_TIMEOUT", default=60),
+    "MAX_STALE": env.int("GRAPH_CACHE_MAX_STALE", default=24 * 60 * 60),
+    "LOCK_DIR": env("GRAPH_CACHE_LOCK_DIR", default=None),
+}
+# seconds a page of the dataset list is cached
+DATASET_LIST_CACHE_TIMEOUT = env.int("DATASET_LIST_CACHE_TIMEOUT", default=30)
+
+# RO-Crate zip downloads: payloads of files are fetched ahead of the zip stream by PREFETCH_WORKERS threads.
+# Up to PREFETCH_PAYLOADS payloads are fetched ahead, kept in memory up to PREFETCH_MEMORY bytes in total and spooled to disk otherwise.
+ROCRATE_DOWNLOAD = {
+    "PREFETCH_WORKERS": env.int("ROCRATE_PREFETCH_WORKERS", default=4),
+    "PREFETCH_PAYLOADS": env.int("ROCRATE_PREFETCH_PAYLOADS", default=8),
+    "PREFETCH_MEMORY": env.int("ROCRATE_PREFETCH_MEMORY", default=64 * 1024 * 1024),
+    # payloads are fetched with a connection pool per worker process, shared by all threads
+    "POOL_SIZE": env.int("ROCRATE_POOL_SIZE", default=20),
+    "FETCH_TIMEOUT": env.float("ROCRATE_FETCH_TIMEOUT", default=60),
+    "VERIFY_TLS": env.bool("ROCRATE_VERIFY_TLS", default=False),
+    # "auto" stores files that are compressed already (by encodingFormat) and deflates the others,
+    # except for files of unknown formats larger than COMPRESSION_SIZE_THRESHOLD. "deflate" compresses all files, "store" none.
+    "COMPRESSION": env("ROCRATE_COMPRESSION", default="auto"),
+    "COMPRESSION_SIZE_THRESHOLD": env.int("ROCRATE_COMPRESSION_SIZE_THRESHOLD", default=16 * 1024 * 1024),
+    # if set, built archives are stored in this directory and served from it until their dataset is modified.
+    # The least recently used archives are removed when the archives exceed ARCHIVE_MAX_SIZE bytes.
+    "ARCHIVE_DIR": env("ROCRATE_ARCHIVE_DIR", default=None),
+    "ARCHIVE_MAX_SIZE": env.int("ROCRATE_ARCHIVE_MAX_SIZE", default=10 * 1024 * 1024 * 1024),
+}
+
+# Resumable RO-Crate uploads of the workflow API: uploads are assembled in UPLOAD_DIR, which is shared by all worker processes.
+# Uploads that were not written to for MAX_AGE seconds are removed.
+ROCRATE_UPLOAD = {
+    "UPLOAD_DIR": env("ROCRATE_UPLOAD_DIR", default=BASE_DIR / "uploads"),
+    "MAX_SIZE": env.int("ROCRATE_UPLOAD_MAX_SIZE", default=20 * 1024 * 1024 * 1024),
+    "MAX_CHUNK_SIZE": env.int("ROCRATE_UPLOAD_MAX_CHUNK_SIZE", default=64 * 1024 * 1024),
+    "MAX_AGE": env.int("ROCRATE_UPLOAD_MAX_AGE", default=24 * 60 * 60),
+}
 
 WSGI_APPLICATION = "cwr_frontend.wsgi.application"
 
@@ -0,0 +1,99 @@
+import os
+import time
+
+from django.test import RequestFactory
+
+from cwr_frontend.archive_store import ArchiveStore, archive_response
+
+
+def test_archive_store(tmp_path):
+    store = ArchiveStore(str(tmp_path), max_size=100)
+    key = store.key("cwr/abc", "2024-11-23T02:00:54.459Z", nested=True, compression="auto")
+    assert key != store.key("cwr/abc", "2024-11-24T00:00:00.000Z", nested=True, compression="auto")
+    assert key != store.key("cwr/abc", "2024-11-23T02:00:54.459Z", nested=True, compression="store")
+    assert store.get(key) is None
+
+    # archives are stored once they were streamed completely
+    chunks = store.store(key, iter([b"abc", b"def"]))
+    assert next(chunks) == b"abc"
+    assert store.get(key) is None
+    assert list(chunks) == [b"def"]
+    archive = store.get(key)
+    assert archive is not None
+    file, size = archive
+    with file:
+        assert size == 6
+        assert file.read() == b"abcdef"
+
+    # nothing is stored for aborted streams or archives larger than max_size
+    aborted = store.store("aborted", iter([b"abc", b"def"]))
+    next(aborted)
+    aborted.close()
+    assert list(store.store("large", iter([b"x" * 60, b"x" * 60]))) == [b"x" * 60, b"x" * 60]
+    assert store.get("aborted") is None
+    assert store.get("large") is None
+    assert os.listdir(tmp_path) == [f"{key}.zip"]
+
+
+def test_archive_store_evicts_least_recently_used(tmp_path):
+    store = ArchiveStore(str(tmp_path), max_size=100)
+    for i, key in enumerate(["a", "b", "c"]):
+        list(store.store(key, [b"x" * 40]))
+        os.utime(store.path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    assert store.get("a") is None  # evicted when c was stored
+
+    file, _ = store.get("b")  # mark b as used
+    file.close()
+    list(store.store("d", [b"x" * 40]))
+    assert os.path.exists(store.path("b"))
+    assert store.get("c") is None
+    assert os.path.exists(store.path("d"))
+
+
+def test_archive_store_reads_evicted_archive(tmp_path):
+    store = ArchiveStore(str(tmp_path), max_size=100)
+    list(store.store("a", [b"x" * 40]))
+    file, size = store.get("a")
+    # the archive is evicted while it is being sent
+    os.remove(store.path("a"))
+    response = archive_response(RequestFactory().get("/"), file, size, "a", "archive.zip")
+    assert response["Content-Length"] == "40"
+    assert b"".join(response.streaming_content) == b"x" * 40
+
+
+def test_archive_response(tmp_path):
+    path = tmp_path / "archive.zip"
+    path.write_bytes(b"0123456789")
+    factory = RequestFactory()
+
+    def respond(request):
+        return archive_response(request, open(path, "rb"), 10, "key", "archive.zip")
+
+    response = respond(factory.get("/"))
+    assert response.status_code == 200
+    assert response["Content-Length"] == "10"
+    assert response["ETag"] == '"key"'
+    assert response["Accept-Ranges"] == "bytes"
+    assert b"".join(response.streaming_content) == b"0123456789"
+
+    response = respond(factory.get("/", HTTP_RANGE="bytes=2-5"))
+    assert response.status_code == 206
+    assert response["Content-Range"] == "bytes 2-5/10"
+    assert response["Content-Length"] == "4"
+    assert b"".join(response.streaming_content) == b"2345"
+
+    response = respond(factory.get("/", HTTP_RANGE="bytes=7-", HTTP_IF_RANGE='"key"'))
+    assert b"".join(response.streaming_content) == b"789"
+    response = respond(factory.get("/", HTTP_RANGE="bytes=-2"))
+    assert b"".join(response.streaming_content) == b"89"
+
+    # the whole archive is sent if it changed since the first part was downloaded
+    response = respond(factory.get("/", HTTP_RANGE="bytes=7-", HTTP_IF_RANGE='"other"'))
+    assert response.status_code == 200
+
+    response = respond(factory.get("/", HTTP_RANGE="bytes=10-"))
+    assert response.status_code == 416
+    assert response["Content-Range"] == "bytes */10"
+
+    response = respond(factory.get("/", HTTP_IF_NONE_MATCH='"key"'))
+    assert response.status_code == 304
@@ -0,0 +1,134 @@
+import time
+
+import pytest
+import yaml
+
+from cwr_frontend.argo_graph import workflow_to_graph
+
+DAG_WORKFLOW = """
+apiVersion: argoproj.io/v1alpha1
+kind: Workflow
+spec:
+  entrypoint: main
+  artifactGC:
+    strategy: OnWorkflowDeletion
+  templates:
+    - name: main
+      dag:
+        tasks:
+          - name: download
+            template: download
+          - name: process
+            template: process
+            dependencies: [download]
+            arguments:
+              artifacts:
+                - name: data
+                  from: "{{tasks.download.outputs.artifacts.data}}"
+          - name: report
+            template: report
+            depends: "process.Succeeded && download"
+            arguments:
+              artifacts:
+                - name: result
+                  from: "{{tasks.process.outputs.artifacts.result}}"
+                - name: template
+                  http:
+                    url: https://example.com/template.md
+    - name: download
+      outputs:
+        artifacts:
+          - name: data
+            path: /tmp/data
+    - name: process
+      steps:
+        - - name: clean
+            template: clean
+            arguments:
+              artifacts:
+                - name: data
+                  from: "{{inputs.artifacts.data}}"
+        - - name: model-a
+            template: model
+          - name: model-b
+            template: model
+      outputs:
+        artifacts:
+          - name: result
+            from: "{{steps.clean.outputs.artifacts.cleaned}}"
+    - name: clean
+      outputs:
+        artifacts:
+          - name: cleaned
+            path: /tmp/cleaned
+            artifactGC:
+              strategy: Never
+    - name: model
+      container:
+        image: model
+    - name: report
+      container:
+        image: report
+"""
+
+
+def node_data(graph):
+    return {node["data"]["id"]: node["data"] for node in graph["elements"]["nodes"]}
+
+
+def edges(graph):
+    return {(edge["data"]["source"], edge["data"]["target"], edge["data"]["type"]) for edge in graph["elements"]["edges"]}
+
+
+def test_dag_workflow_graph():
+    graph = workflow_to_graph(yaml.safe_load(DAG_WORKFLOW))
+    assert graph["directed"] and not graph["multigraph"]
+    nodes = node_data(graph)
+
+    # nested steps are expanded
+    assert {id for id, data in nodes.items() if data["type"] == "task"} == {
+        "download", "process.clean", "process.model-a", "process.model-b", "report"}
+    assert nodes["process.model-a"]["name"] == "model-a"
+
+    # artifacts are garbage collected following the workflow strategy unless overridden
+    assert nodes["download/data"]["gc"] is True
+    assert nodes["process.clean/cleaned"]["gc"] is False
+    assert nodes["report/template"]["gc"] is False
+
+    assert edges(graph) == {
+        ("download", "process.clean", "control"),
+        ("process.clean", "process.model-a", "control"),
+        ("process.clean", "process.model-b", "control"),
+        ("process.model-a", "report", "control"),
+        ("process.model-b", "report", "control"),
+        ("download", "report", "control"),
+        ("download", "download/data", "data"),
+        ("download/data", "process.clean", "data"),
+        ("process.clean", "process.clean/cleaned", "data"),
+        ("process.clean/cleaned", "report", "data"),
+        ("report/template", "report", "data"),
+    }
+
+
+def test_single_template_workflow_graph():
+    graph = workflow_to_graph({"spec": {"entrypoint": "hello", "templates": [{"name": "hello", "container": {}}]}})
+    assert list(node_data(graph)) == ["hello"]
+    assert graph["elements"]["edges"] == []
+
+
+def test_invalid_workflow():
+    with pytest.raises(ValueError):
+        workflow_to_graph({"kind": "Workflow"})
+    with pytest.raises(ValueError):
+        workflow_to_graph({"spec": {"templates": [{"name": "main", "dag": {"tasks": [{"template": "x"}]}}]}})
+
+
+def test_large_dag_workflow_graph():
+    tasks = [{"name": f"task-{i}", "template": "work", "dependencies": [f"task-{i // 2}"] if i > 0 else []} for i in range(1000)]
+    workflow = {"spec": {"entrypoint": "main", "templates": [{"name": "main", "dag": {"tasks": tasks}}, {"name": "work"}]}}
+
+    start = time.perf_counter()
+    graph = workflow_to_graph(workflow)
+    assert time.perf_counter() - start < 0.5
+    assert len(graph["elements"]["nodes"]) == 1000
+    assert len(graph["elements"]["edges"]) == 999
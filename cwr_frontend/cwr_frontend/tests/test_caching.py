@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from cwr_frontend.caching import SingleFlight, StaleWhileRevalidateCache, TwoTierCache
+
+
+def _counting_fetch(values):
+    calls = []
+
+    def fetch():
+        calls.append(threading.current_thread().name)
+        return values[len(calls) - 1]
+    return fetch, calls
+
+
+def test_two_tier_cache_roundtrip():
+    cache = TwoTierCache("test")
+    assert cache.get("roundtrip") is None
+    cache.set("roundtrip", {"a": [1, 2]}, 10)
+    assert cache.get("roundtrip") == {"a": [1, 2]}
+    cache.delete("roundtrip")
+    assert cache.get("roundtrip", "default") == "default"
+
+
+def test_stale_while_revalidate_serves_fresh_value():
+    cache = StaleWhileRevalidateCache(TwoTierCache("test"), fresh_for=60, max_stale=60)
+    fetch, calls = _counting_fetch(["v1", "v2"])
+
+    assert cache.get("fresh", fetch) == "v1"
+    assert cache.get("fresh", fetch) == "v1"
+    assert len(calls) == 1
+
+
+def test_stale_while_revalidate_refreshes_in_background():
+    cache = StaleWhileRevalidateCache(TwoTierCache("test"), fresh_for=0.05, max_stale=60)
+    fetch, calls = _counting_fetch(["v1", "v2"])
+
+    assert cache.get("stale", fetch) == "v1"
+    time.sleep(0.1)
+    # stale value is returned immediately and refreshed in another thread
+    assert cache.get("stale", fetch) == "v1"
+    for _ in range(100):
+        if cache.get("stale", fetch) == "v2":
+            break
+        time.sleep(0.01)
+    assert cache.get("stale", fetch) == "v2"
+    assert len(calls) == 2
+    assert calls[1] != threading.current_thread().name
+
+
+def test_stale_while_revalidate_refreshes_expired_value_synchronously():
+    cache = StaleWhileRevalidateCache(TwoTierCache("test"), fresh_for=0.05, max_stale=0.05)
+    fetch, calls = _counting_fetch(["v1", "v2"])
+
+    assert cache.get("expired", fetch) == "v1"
+    time.sleep(0.15)
+    assert cache.get("expired", fetch) == "v2"
+    assert calls == [threading.current_thread().name] * 2
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fetch))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 10
+    assert all(result is results[0] for result in results)
+
+    # the next call after completion fetches again
+    flight.do("key", fetch)
+    assert len(calls) == 2
+
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+
+    def fetch():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fetch)
+
+
+def test_stale_while_revalidate_with_lock_dir(tmp_path):
+    cache = StaleWhileRevalidateCache(TwoTierCache("test"), fresh_for=60, max_stale=60, lock_dir=str(tmp_path))
+    fetch, calls = _counting_fetch(["v1", "v2"])
+
+    assert cache.get("locked", fetch) == "v1"
+    assert cache.get("locked", fetch) == "v1"
+    assert len(calls) == 1
+
+
+def test_stale_while_revalidate_skips_fetch_for_unchanged_version():
+    cache = StaleWhileRevalidateCache(TwoTierCache("test"), fresh_for=0.05, max_stale=0.05)
+    fetch, calls = _counting_fetch(["v1", "v2"])
+    versions = ["2024-01-01", "2024-01-01", "2024-02-01"]
+
+    def get_version():
+        return versions.pop(0)
+
+    assert cache.get("versioned", fetch, get_version) == "v1"
+    time.sleep(0.15)
+    # version did not change, value is reused
+    assert cache.get("versioned", fetch, get_version) == "v1"
+    assert len(calls) == 1
+    time.sleep(0.15)
+    assert cache.get("versioned", fetch, get_version) == "v2"
+    assert len(calls) == 2
@@ -0,0 +1,111 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from cwr_frontend.http_session import PooledSession
+
+
+class _Upstream(ThreadingHTTPServer):
+    """ Local server answering requests with the given status codes in order, after delay seconds """
+
+    def __init__(self, statuses: list[int], delay: float = 0):
+        super().__init__(("127.0.0.1", 0), _UpstreamHandler)
+        self.statuses = statuses
+        self.delay = delay
+        self.requests: list[str] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    server: _Upstream
+
+    def _respond(self):
+        self.server.requests.append(self.command)
+        status = self.server.statuses[min(len(self.server.requests), len(self.server.statuses)) - 1]
+        time.sleep(self.server.delay)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    servers = []
+
+    def start(statuses, delay=0):
+        server = _Upstream(statuses, delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pooled_session_retries_get(upstream):
+    server = upstream([502, 503, 200])
+    session = PooledSession(retries=3, backoff_factor=0)
+
+    response = session.get(server.url, endpoint="test")
+    assert response.status_code == 200
+    assert server.requests == ["GET", "GET", "GET"]
+    assert session.stats.snapshot()["test"]["count"] == 1
+
+
+def test_pooled_session_retries_only_idempotent_posts(upstream):
+    server = upstream([503, 503, 200])
+    session = PooledSession(retries=3, backoff_factor=0)
+
+    assert session.post(server.url).status_code == 503
+    assert server.requests == ["POST"]
+
+    assert session.post(server.url, idempotent=True).status_code == 200
+    assert server.requests == ["POST", "POST", "POST"]
+    # a request that still fails after all retries returns the last response
+    assert PooledSession(retries=1, backoff_factor=0).get(upstream([503]).url).status_code == 503
+
+
+def test_pooled_session_timeout(upstream):
+    server = upstream([200], delay=0.5)
+    session = PooledSession(timeout=0.1, retries=3, backoff_factor=0, read_retries=0)
+
+    # the default timeout applies to requests without their own, read timeouts are not retried
+    with pytest.raises(requests.ReadTimeout):
+        session.get(server.url)
+    assert server.requests == ["GET"]
+    with pytest.raises(requests.ReadTimeout):
+        session.post(server.url, idempotent=True)
+    assert server.requests == ["GET", "POST"]
+    assert session.get(server.url, timeout=2).status_code == 200
+
+
+def test_pooled_session_per_thread(upstream):
+    session = PooledSession()
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(session.session))
+    thread.start()
+    thread.join()
+
+    # each thread has its own session, all of them share the connection pool of the process
+    assert session.session is session.session
+    assert sessions[0] is not session.session
+    assert sessions[0].get_adapter("https://") is session.session.get_adapter("https://")
+
+    # a forked worker process does not reuse the connections of its parent
+    parent_session = session.session
+    with patch("os.getpid", return_value=-1):
+        assert session.session is not parent_session
+        assert session.session.get_adapter("https://") is not parent_session.get_adapter("https://")
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock, patch
+
+import requests
+from cachetools import LRUCache
+from pyld import jsonld
+
+from cwr_frontend import jsonld_utils
+from cwr_frontend.api.management.commands.fetch_jsonld_contexts import Command as FetchContextsCommand
+from cwr_frontend.jsonld_utils import BUNDLED_CONTEXTS, ValueRewriter, pyld_caching_document_loader, replace_values
+
+
+def test_value_rewriter_ids():
+    rewriter = ValueRewriter(ids={"cwr/a": "https://example.com/a", "cwr/b": "#cwr/b"})
+    obj = {"author": {"@id": "cwr/a"}, "hasPart": ["cwr/a", "cwr/b", "cwr/c"], "name": "cwr/ab", "size": 1}
+
+    assert rewriter.rewrite(obj) == {
+        "author": {"@id": "https://example.com/a"},
+        "hasPart": ["https://example.com/a", "#cwr/b", "cwr/c"],
+        "name": "cwr/ab",  # ids are only replaced if they match exactly
+        "size": 1,
+    }
+    # the object is not modified
+    assert obj["hasPart"] == ["cwr/a", "cwr/b", "cwr/c"]
+
+
+def test_value_rewriter_scalars():
+    rewriter = ValueRewriter(ids={"1": "#cwr/1", "True": "#cwr/true"}, patterns={r"2(.*)": r"#cwr/2\1"})
+    obj = {"identifier": 1, "valid": True, "version": 2.5, "size": 3, "license": None}
+
+    # scalars are matched as strings and only converted if they are replaced
+    assert rewriter.rewrite(obj) == {"identifier": "#cwr/1", "valid": "#cwr/true", "version": "#cwr/2.5", "size": 3, "license": None}
+    assert rewriter.rewrite(obj["size"]) is obj["size"]
+
+
+def test_value_rewriter_unchanged_objects():
+    rewriter = ValueRewriter(ids={"cwr/a": "https://example.com/a"})
+    unchanged = {"@id": "cwr/b", "keywords": ["a", "b"]}
+    obj = {"author": {"@id": "cwr/a"}, "about": unchanged}
+
+    rewritten = rewriter.rewrite(obj)
+    assert rewritten is not obj
+    assert rewritten["about"] is unchanged
+    assert rewriter.rewrite(unchanged) is unchanged
+
+
+def test_replace_values_patterns():
+    replacements = {r"https://schema\.org(.*)": r"http://schema.org\1", r"https://(.*)": r"http://\1"}
+    obj = {"@context": ["https://schema.org/", "https://w3id.org/ro/crate"], "name": "see https://schema.org"}
+
+    assert replace_values(obj, replacements) == {
+        "@context": ["http://schema.org/", "http://w3id.org/ro/crate"],
+        "name": "see https://schema.org",  # patterns only match at the start of a value
+    }
+
+
+def test_bundled_contexts_are_loaded_offline(tmp_path, monkeypatch):
+    context = {"@context": {"name": "http://schema.org/name"}}
+
+    def get(url, headers=None):
+        return MagicMock(url=url, headers={"content-type": "application/ld+json"}, json=MagicMock(return_value=context))
+
+    # bundle the contexts as the docker build does
+    with patch.object(jsonld_utils.requests, "get", side_effect=get):
+        FetchContextsCommand(stdout=MagicMock()).handle(urls=[], dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == len(BUNDLED_CONTEXTS)
+
+    monkeypatch.setattr(jsonld_utils, "CONTEXT_BUNDLE_DIR", str(tmp_path))
+    monkeypatch.setattr(jsonld_utils, "_loaded_documents", {})
+    # static contexts are kept by pyld for the whole process, so the test contexts must not be resolved in its cache
+    monkeypatch.setattr(jsonld, "_resolved_context_cache", LRUCache(maxsize=10))
+    with patch.object(jsonld_utils.requests, "get", side_effect=requests.ConnectionError("offline")) as get_offline:
+        for url in BUNDLED_CONTEXTS:
+            document = pyld_caching_document_loader(url)
+            assert document["document"] == context
+            assert document["tag"] == "static"
+
+        jsonld.set_document_loader(pyld_caching_document_loader)
+        expanded = jsonld.expand({"@context": "https://w3id.org/ro/crate/1.1/context", "name": "crate"})
+        assert expanded == [{"http://schema.org/name": [{"@value": "crate"}]}]
+    get_offline.assert_not_called()
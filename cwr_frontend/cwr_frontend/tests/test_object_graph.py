@@ -0,0 +1,35 @@
+import json
+import os
+
+from cwr_frontend.object_graph import ObjectGraph
+
+
+def load_graph(json_file_name: str) -> ObjectGraph:
+    return ObjectGraph(json.load(open(os.path.join(os.path.dirname(__file__), json_file_name), "r")))
+
+
+def test_object_graph_indexes():
+    objects = load_graph("dataset_objects_workflow.json")
+    dataset = objects.first_of_type("Dataset")
+    assert dataset is not None
+
+    # lookups by id keep the order of the given ids and skip missing ones
+    assert objects.get_all(dataset["hasPart"]) == [objects[part_id] for part_id in dataset["hasPart"] if part_id in objects]
+    assert objects.get_all(["missing"]) == []
+
+    # type index matches a scan over all objects
+    for type in ["Dataset", "CreateAction", "Person", "MediaObject"]:
+        assert objects.first_of_type(type) == next((obj for obj in objects.values() if type in obj["@type"]), None)
+
+
+def test_object_graph_from_list():
+    objects = ObjectGraph.from_list([
+        {"@id": "parent", "@type": "Dataset"},
+        {"@id": "child", "@type": ["Dataset"], "isPartOf": ["parent"]},
+        {"@id": "file", "@type": "MediaObject", "isPartOf": [{"@id": "child"}]},
+        {"@type": "Thing"},
+    ])
+    assert len(objects) == 3
+    assert objects.get_all(objects["file"]["isPartOf"]) == [objects["child"]]
+    assert objects.has_type("child", "Dataset")
+    assert not objects.has_type("missing", "Dataset")
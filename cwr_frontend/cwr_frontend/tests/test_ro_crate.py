@@ -11,7 +11,7 @@ from rocrate.rocrate import ROCrate
 from rocrate.model import RootDataset
 import tempfile
 
-from cwr_frontend.rocrate_builder import build_ROCrate
+from cwr_frontend.rocrate_builder import build_ROCrate, detached_metadata
 
 def compare_dicts(expected, actual):
     for key in expected:
@@ -22,6 +22,12 @@ def compare_dicts(expected, actual):
 
 
 def build_test_crate(json_file_name: str, detached: bool, workflow_only: bool = False) -> ROCrate:
+    dataset_id, dataset_objects, remote_urls = load_test_objects(json_file_name)
+    ro_crate = build_ROCrate(dataset_id, dataset_objects, remote_urls=remote_urls, with_preview=False, detached=detached, workflow_only=workflow_only)
+    return ro_crate
+
+
+def load_test_objects(json_file_name: str) -> tuple[str, dict, dict[str, str]]:
     dataset_objects = json.load(open(os.path.join(os.path.dirname(__file__), json_file_name), "r"))
     remote_urls = {}
 
@@ -42,8 +48,7 @@ def build_test_crate(json_file_name: str, detached: bool, workflow_only: bool =
             for parent in object["isPartOf"]:
                 remote_urls[parent] = "https://example.com/" + parent
 
-    ro_crate = build_ROCrate(dataset_id, dataset_objects, remote_urls=remote_urls, with_preview=False, detached=detached, workflow_only=workflow_only)
-    return ro_crate
+    return dataset_id, dataset_objects, remote_urls
 
 
 def validate_ro_crate_profile(ro_crate: ROCrate, profile, ignore_regex=[]):
@@ -449,4 +454,63 @@ def test_workflow_ro_crate():
         "@type": "FormalParameter",
         "name": "text",
         "additionalType": "Text",
-    }, formal_param.as_jsonld())
\ No newline at end of file
+    }, formal_param.as_jsonld())
+
+
+@pytest.mark.parametrize("json_file_name", ["dataset_objects.json", "dataset_objects_workflow.json",
+                                            "dataset_objects_nested_crate_parent.json", "dataset_objects_nested_crate_child.json"])
+@pytest.mark.parametrize("workflow_only", [False, True])
+def test_detached_metadata(json_file_name, workflow_only):
+    """ Should return the same metadata as the detached crate, without modifying the objects """
+    dataset_id, dataset_objects, remote_urls = load_test_objects(json_file_name)
+    if workflow_only and "mainEntity" not in dataset_objects[dataset_id]:
+        with pytest.raises(ValueError):
+            detached_metadata(dataset_id, dataset_objects, remote_urls, workflow_only=True)
+        return
+
+    original_objects = json.loads(json.dumps(dataset_objects))
+    with patch("rocrate.model.root_dataset.iso_now", return_value="2025-01-01T00:00:00+00:00"), \
+            patch("cwr_frontend.rocrate_builder.iso_now", return_value="2025-01-01T00:00:00+00:00"):
+        expected = build_ROCrate(dataset_id, dataset_objects, remote_urls=remote_urls, detached=True, workflow_only=workflow_only).metadata.generate()
+        metadata = detached_metadata(dataset_id, dataset_objects, remote_urls, workflow_only=workflow_only)
+
+    assert json.dumps(metadata) == json.dumps(expected)
+    assert dataset_objects == original_objects
+
+
+def test_detached_metadata_nested_datasets():
+    """ Should reference nested datasets and their files by their remote urls, as the detached crate does """
+    dataset_id, dataset_objects, remote_urls = load_test_objects("dataset_objects_nested_crate_parent.json")
+    child_ids = [object_id for object_id, obj in dataset_objects.items() if dataset_id in obj.get("isPartOf", [])
+                 and "Dataset" in obj["@type"]]
+    assert len(child_ids) == 2
+
+    with patch("rocrate.model.root_dataset.iso_now", return_value="2025-01-01T00:00:00+00:00"), \
+            patch("cwr_frontend.rocrate_builder.iso_now", return_value="2025-01-01T00:00:00+00:00"):
+        expected = build_ROCrate(dataset_id, dataset_objects, remote_urls=remote_urls, detached=True).metadata.generate()
+        metadata = detached_metadata(dataset_id, dataset_objects, remote_urls)
+
+    assert metadata["@context"] == expected["@context"]
+    assert [entity["@id"] for entity in metadata["@graph"]] == [entity["@id"] for entity in expected["@graph"]]
+    for entity, expected_entity in zip(metadata["@graph"], expected["@graph"]):
+        assert entity == expected_entity
+
+    entities = {entity["@id"]: entity for entity in metadata["@graph"]}
+    root_parts = [part["@id"] for part in entities[remote_urls[dataset_id] + "/"]["hasPart"]]
+    for child_id in child_ids:
+        child_url = remote_urls[child_id] + "/"
+        assert child_url in root_parts
+        assert entities[child_url]["@type"] == "Dataset"
+        for part in entities[child_url]["hasPart"]:
+            assert part["@id"].startswith("https://example.com/")
+            assert entities[part["@id"]]["@type"] == "File"
+
+
+def test_detached_metadata_missing_urls():
+    """ Should raise an error if a remote url to the dataset or a file is missing """
+    dataset_id, dataset_objects, remote_urls = load_test_objects("dataset_objects_workflow.json")
+
+    with pytest.raises(ValueError):
+        detached_metadata(dataset_id, dataset_objects, {dataset_id: remote_urls[dataset_id]})
+    with pytest.raises(ValueError):
+        detached_metadata(dataset_id, dataset_objects, {k: v for k, v in remote_urls.items() if k != dataset_id})
@@ -0,0 +1,73 @@
+import io
+import json
+import zipfile
+from unittest.mock import patch
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+
+from cwr_frontend.rocrate_upload import get_crate_workflow_from_zip
+
+
+def _metadata(license=True, main_entity="workflow.yaml"):
+    root_dataset = {
+        "@id": "./",
+        "@type": "Dataset",
+        "name": "Test workflow",
+        "hasPart": [{"@id": "workflow.yaml"}, {"@id": "data.bin"}],
+    }
+    if main_entity:
+        root_dataset["mainEntity"] = {"@id": main_entity}
+    if license:
+        root_dataset["license"] = "https://spdx.org/licenses/MIT"
+    return {
+        "@context": "https://w3id.org/ro/crate/1.1/context",
+        "@graph": [
+            {"@id": "ro-crate-metadata.json", "@type": "CreativeWork", "about": {"@id": "./"}, "conformsTo": {"@id": "https://w3id.org/ro/crate/1.1"}},
+            root_dataset,
+            {"@id": "workflow.yaml", "@type": ["File", "SoftwareSourceCode", "ComputationalWorkflow"]},
+            {"@id": "data.bin", "@type": "File"},
+        ],
+    }
+
+
+def _crate_zip(metadata=None, workflow=b"kind: Workflow\nspec:\n  entrypoint: main\n") -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("ro-crate-metadata.json", json.dumps(metadata or _metadata()))
+        archive.writestr("workflow.yaml", workflow)
+        archive.writestr("data.bin", b"x" * 100000)
+    return buffer.getvalue()
+
+
+def test_get_crate_workflow_from_zip():
+    crate, workflow = get_crate_workflow_from_zip(SimpleUploadedFile("crate.zip", _crate_zip(), content_type="application/zip"))
+    assert crate.root_dataset["name"] == "Test workflow"
+    assert crate.root_dataset["license"] == "https://spdx.org/licenses/MIT"
+    assert workflow == {"kind": "Workflow", "spec": {"entrypoint": "main"}}
+
+
+def test_get_crate_workflow_from_temporary_upload():
+    file = TemporaryUploadedFile("crate.zip", "application/zip", 0, None)
+    file.write(_crate_zip())
+    file.flush()
+    with patch.object(zipfile.ZipFile, "open", autospec=True, side_effect=zipfile.ZipFile.open) as open_member:
+        crate, workflow = get_crate_workflow_from_zip(file)
+    assert workflow["kind"] == "Workflow"
+    # only the metadata and the workflow are extracted
+    assert [call.args[1] for call in open_member.call_args_list] == ["ro-crate-metadata.json", "workflow.yaml"]
+
+
+@pytest.mark.parametrize("content, content_type, message", [
+    (_crate_zip(), "text/plain", "File is not a zip file"),
+    (b"no zip file", "application/zip", "File is not a zip file"),
+    (_crate_zip(_metadata(license=False)), "application/zip", "License not defined in RO-Crate"),
+    (_crate_zip(_metadata(main_entity=None)), "application/zip", "Workflow file not found in RO-Crate"),
+    (_crate_zip(_metadata(main_entity="missing.yaml")), "application/zip", "Workflow file not found in RO-Crate"),
+    (_crate_zip(workflow=b"kind: Workflow\n  spec: {"), "application/zip", "Workflow file corrupted"),
+], ids=["content_type", "no_zip", "no_license", "no_main_entity", "missing_workflow", "corrupted_workflow"])
+def test_get_crate_workflow_from_zip_invalid(content, content_type, message):
+    with pytest.raises(ValidationError) as e:
+        get_crate_workflow_from_zip(SimpleUploadedFile("crate.zip", content, content_type=content_type))
+    assert e.value.message.startswith(message)
@@ -0,0 +1,117 @@
+import io
+import threading
+import time
+import zipfile
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from cwr_frontend.rocrate_zip import PayloadFetcher, PayloadPrefetcher, compression_for, stream_zip
+from cwr_frontend.tests.test_ro_crate import build_test_crate
+
+
+def test_prefetcher_keeps_order():
+    def fetch(url):
+        time.sleep(0.01 * (5 - int(url)))  # later payloads finish first
+        yield url.encode()
+        yield b"-payload"
+
+    urls = [str(i) for i in range(6)]
+    prefetcher = PayloadPrefetcher(urls, fetch, workers=3, max_payloads=2, max_memory=1024)
+    assert [(url, payload.read()) for url, payload in prefetcher] == [(url, f"{url}-payload".encode()) for url in urls]
+
+
+def test_prefetcher_is_bounded_and_stops_on_close():
+    fetched = []
+    release = threading.Event()
+
+    def fetch(url):
+        fetched.append(url)
+        release.wait(1)
+        yield b"x"
+
+    prefetcher = PayloadPrefetcher([str(i) for i in range(100)], fetch, workers=2, max_payloads=4)
+    payloads = iter(prefetcher)
+    release.set()
+    url, payload = next(payloads)
+    assert url == "0"
+    payloads.close()
+
+    time.sleep(0.1)
+    # only the payloads fetched ahead were requested
+    assert len(fetched) <= 5
+
+
+def test_prefetcher_raises_fetch_errors():
+    def fetch(url):
+        if url == "broken":
+            raise IOError("failed")
+        yield b"x"
+
+    with pytest.raises(IOError):
+        list(PayloadPrefetcher(["ok", "broken"], fetch))
+
+
+class _Response(io.BytesIO):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _payload(url):
+    return f"content of {url}".encode() * 1000
+
+
+@pytest.mark.parametrize("json_file_name", ["dataset_objects.json", "dataset_objects_workflow.json"])
+def test_stream_zip(json_file_name):
+    """ Should contain the same files as the zip streamed by ro-crate-py """
+    with patch("urllib.request.urlopen", side_effect=lambda url: _Response(_payload(url))):
+        expected = zipfile.ZipFile(io.BytesIO(b"".join(build_test_crate(json_file_name, detached=False).stream_zip())))
+    with patch.object(PayloadFetcher, "fetch", side_effect=lambda url, chunk_size: iter([_payload(url)])):
+        actual = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(build_test_crate(json_file_name, detached=False)))))
+
+    assert actual.namelist() == expected.namelist()
+    for name in expected.namelist():
+        assert actual.read(name) == expected.read(name)
+
+
+def test_compression_for():
+    crate = build_test_crate("dataset_objects_workflow.json", detached=False)
+    workflow = crate.dereference("workflow.yaml")
+    assert compression_for(workflow) == zipfile.ZIP_DEFLATED
+    assert compression_for(crate.metadata) == zipfile.ZIP_DEFLATED
+    assert compression_for(workflow, mode="store") == zipfile.ZIP_STORED
+
+    crate = build_test_crate("dataset_objects.json", detached=False)
+    for entity in crate.data_entities:
+        # png image and NetCDF file
+        assert compression_for(entity) == zipfile.ZIP_STORED
+        assert compression_for(entity, mode="deflate") == zipfile.ZIP_DEFLATED
+
+
+def test_stream_zip_compression():
+    with patch.object(PayloadFetcher, "fetch", side_effect=lambda url, chunk_size: iter([b"x" * 10000])):
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(build_test_crate("dataset_objects.json", detached=False)))))
+        stored_archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(build_test_crate("dataset_objects.json", detached=False),
+                                                                        compression="store"))))
+
+    compression = {info.filename.split("/")[-1]: info.compress_type for info in archive.infolist()}
+    assert compression == {
+        "Continuous.nc": zipfile.ZIP_STORED,
+        "INPUTS.png": zipfile.ZIP_STORED,
+        "ro-crate-metadata.json": zipfile.ZIP_DEFLATED,
+    }
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in stored_archive.infolist())
+    assert stored_archive.namelist() == archive.namelist()
+
+
+def test_payload_fetcher():
+    session = MagicMock()
+    response = session.get.return_value.__enter__.return_value
+    response.iter_content.return_value = iter([b"abc", b"def"])
+
+    assert list(PayloadFetcher(session).fetch("https://example.com/payload", chunk_size=3)) == [b"abc", b"def"]
+    session.get.assert_called_once_with("https://example.com/payload", endpoint="payloads", stream=True)
+    response.raise_for_status.assert_called_once()
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from cwr_frontend.upload_store import ChecksumMismatch, UploadConflict, UploadNotFound, UploadStore
+
+
+def _checksum(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_upload_store(tmp_path):
+    store = UploadStore(str(tmp_path), max_size=100, max_chunk_size=10, max_age=60)
+    data = b"0123456789abcdef"
+    upload = store.create("owner", size=len(data), checksum=_checksum(data))
+    upload_id = upload["upload_id"]
+    assert upload["offset"] == 0
+
+    assert store.write_chunk(upload_id, "owner", 0, [b"0123", b"4567"], _checksum(b"01234567"))["offset"] == 8
+    # chunks must start at the offset of the upload
+    with pytest.raises(UploadConflict) as e:
+        store.write_chunk(upload_id, "owner", 4, [b"4567"], _checksum(b"4567"))
+    assert e.value.offset == 8
+    # the upload is incomplete
+    with pytest.raises(UploadConflict):
+        store.open(upload_id, "owner")
+
+    store.write_chunk(upload_id, "owner", 8, [b"89abcdef"], _checksum(b"89abcdef"))
+    with store.open(upload_id, "owner") as file:
+        assert file.read() == data
+        assert file.size == len(data)
+        assert file.content_type == "application/zip"
+
+    store.remove(upload_id)
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(UploadNotFound):
+        store.get(upload_id, "owner")
+
+
+def test_upload_store_discards_invalid_chunks(tmp_path):
+    store = UploadStore(str(tmp_path), max_size=100, max_chunk_size=10, max_age=60)
+    upload_id = store.create("owner", size=20)["upload_id"]
+
+    with pytest.raises(ChecksumMismatch):
+        store.write_chunk(upload_id, "owner", 0, [b"0123"], _checksum(b"corrupted"))
+    with pytest.raises(ValueError):
+        store.write_chunk(upload_id, "owner", 0, [b"x" * 6, b"x" * 6], _checksum(b"x" * 12))
+
+    def interrupted():
+        yield b"0123"
+        raise IOError("connection lost")
+
+    with pytest.raises(IOError):
+        store.write_chunk(upload_id, "owner", 0, interrupted(), _checksum(b"0123"))
+    assert store.get(upload_id, "owner")["offset"] == 0
+
+    # uploads of other owners or with invalid ids are not found
+    with pytest.raises(UploadNotFound):
+        store.get(upload_id, "other")
+    with pytest.raises(UploadNotFound):
+        store.get("../" + upload_id, "owner")
+
+
+def test_upload_store_verifies_checksum_and_size(tmp_path):
+    store = UploadStore(str(tmp_path), max_size=100, max_chunk_size=10, max_age=60)
+    with pytest.raises(ValueError):
+        store.create("owner", size=101)
+    upload_id = store.create("owner", size=4, checksum=_checksum(b"abcd"))["upload_id"]
+    with pytest.raises(ValueError):
+        store.write_chunk(upload_id, "owner", 0, [b"abcde"], _checksum(b"abcde"))
+    store.write_chunk(upload_id, "owner", 0, [b"abce"], _checksum(b"abce"))
+    with pytest.raises(ChecksumMismatch):
+        store.open(upload_id, "owner")
+
+
+def test_upload_store_expires_uploads(tmp_path):
+    store = UploadStore(str(tmp_path), max_size=100, max_chunk_size=10, max_age=60)
+    expired_id = store.create("owner", size=4)["upload_id"]
+    os.utime(tmp_path / f"{expired_id}.part", (time.time() - 120, time.time() - 120))
+    upload_id = store.create("owner", size=4)["upload_id"]
+
+    with pytest.raises(UploadNotFound):
+        store.get(expired_id, "owner")
+    assert store.get(upload_id, "owner")["offset"] == 0
+
+    # lock files of removed uploads are removed as well
+    (tmp_path / f"{expired_id}.lock").touch()
+    store.expire()
+    assert not (tmp_path / f"{expired_id}.lock").exists()
+
+
+def test_upload_store_lock(tmp_path):
+    store = UploadStore(str(tmp_path), max_size=100, max_chunk_size=10, max_age=60)
+    upload_id = store.create("owner", size=4)["upload_id"]
+    store.write_chunk(upload_id, "owner", 0, [b"ab"], _checksum(b"ab"))
+
+    # only existing uploads of the owner are locked
+    with pytest.raises(UploadNotFound):
+        with store.locked(upload_id, "other"):
+            pass
+    with pytest.raises(UploadNotFound):
+        with store.locked("0" * 32, "owner"):
+            pass
+    assert not (tmp_path / f"{'0' * 32}.lock").exists()
+
+    with store.locked(upload_id, "owner"):
+        # chunks and other requests finalizing the upload are rejected while it is locked
+        with pytest.raises(UploadConflict) as e:
+            store.write_chunk(upload_id, "owner", 2, [b"cd"], _checksum(b"cd"))
+        assert e.value.offset == 2
+        with pytest.raises(UploadConflict):
+            with store.locked(upload_id, "owner"):
+                pass
+    assert store.write_chunk(upload_id, "owner", 2, [b"cd"], _checksum(b"cd"))["offset"] == 4
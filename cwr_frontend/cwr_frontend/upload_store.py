@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from filelock import FileLock, Timeout
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_CHECKSUM_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class UploadConflict(Exception):
+    """ Raised if a chunk does not start at the current offset of the upload or another request holds the upload's lock """
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def is_checksum(value: str) -> bool:
+    """ Whether the value is a hex encoded sha256 checksum """
+    return _CHECKSUM_PATTERN.match(value) is not None
+
+
+class UploadStore:
+    """
+    Directory of resumable uploads, shared by all worker processes.
+
+    An upload is created with its total size and receives the file in chunks, which are appended at the current offset
+    of the upload. A chunk is only kept if its sha256 checksum matches, so an interrupted chunk can be sent again.
+    Uploads that were not written to for max_age seconds are removed.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, directory: str, max_size: int, max_chunk_size: int, max_age: int):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_chunk_size = max_chunk_size
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        if _UPLOAD_ID_PATTERN.match(upload_id) is None:
+            raise UploadNotFound(upload_id)
+        return os.path.join(self.directory, f"{upload_id}{suffix}")
+
+    def create(self, owner: Any, size: int, checksum: str | None = None) -> dict[str, Any]:
+        """ Creates an upload of a file of size bytes and optionally with the sha256 checksum of the whole file """
+        if size <= 0 or size > self.max_size:
+            raise ValueError(f"Size must be between 1 and {self.max_size} bytes")
+        if checksum is not None and not is_checksum(checksum):
+            raise ValueError("Checksum must be a hex encoded sha256 checksum")
+        self.expire()
+
+        upload_id = secrets.token_hex(16)
+        with open(self._path(upload_id, ".json"), "x") as info_file:
+            json.dump({"owner": owner, "size": size, "checksum": checksum}, info_file)
+        open(self._path(upload_id, ".part"), "xb").close()
+        return self.get(upload_id, owner)
+
+    def get(self, upload_id: str, owner: Any) -> dict[str, Any]:
+        """ Returns the upload id, size and current offset of an upload. Uploads of other owners are not found. """
+        try:
+            with open(self._path(upload_id, ".json"), "r") as info_file:
+                info = json.load(info_file)
+            offset = os.path.getsize(self._path(upload_id, ".part"))
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+        if info["owner"] != owner:
+            raise UploadNotFound(upload_id)
+        return {"upload_id": upload_id, "size": info["size"], "offset": offset, "checksum": info["checksum"]}
+
+    def write_chunk(self, upload_id: str, owner: Any, offset: int, chunk: Iterable[bytes], checksum: str) -> dict[str, Any]:
+        """
+        Appends a chunk, given as an iterable of bytes, at offset, which must be the current offset of the upload.
+        The chunk is discarded if it is incomplete, too large or its sha256 checksum does not match.
+        """
+        upload = self.get(upload_id, owner)
+        with self.locked(upload_id, owner):
+            with open(self._path(upload_id, ".part"), "r+b") as part_file:
+                current_offset = os.fstat(part_file.fileno()).st_size
+                if offset != current_offset:
+                    raise UploadConflict(f"Chunk must start at offset {current_offset}", current_offset)
+                part_file.seek(offset)
+                chunk_hash = hashlib.sha256()
+                written = 0
+                try:
+                    for data in chunk:
+                        written += len(data)
+                        if written > self.max_chunk_size:
+                            raise ValueError(f"Chunk is larger than {self.max_chunk_size} bytes")
+                        if offset + written > upload["size"]:
+                            raise ValueError(f"Chunk exceeds the size of the upload of {upload['size']} bytes")
+                        chunk_hash.update(data)
+                        part_file.write(data)
+                    if chunk_hash.hexdigest() != checksum.lower():
+                        raise ChecksumMismatch("Checksum of the chunk does not match")
+                except BaseException:
+                    # keep the upload at the end of the last complete chunk
+                    part_file.truncate(offset)
+                    raise
+        upload["offset"] = offset + written
+        return upload
+
+    @contextmanager
+    def locked(self, upload_id: str, owner: Any) -> Iterator[None]:
+        """
+        Locks an upload while a chunk is written or the upload is finalized. Raises UploadConflict if it is locked already.
+        The lock file is only created for existing uploads of the owner.
+        """
+        self.get(upload_id, owner)
+        lock = FileLock(self._path(upload_id, ".lock"), timeout=0)
+        try:
+            lock.acquire()
+        except Timeout:
+            try:
+                offset = os.path.getsize(self._path(upload_id, ".part"))
+            except FileNotFoundError:
+                raise UploadNotFound(upload_id)
+            raise UploadConflict("Another request is writing or finalizing the upload", offset)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def open(self, upload_id: str, owner: Any) -> UploadedFile:
+        """ Returns the completely uploaded file, after verifying the checksum of the whole file if it was given """
+        upload = self.get(upload_id, owner)
+        if upload["offset"] != upload["size"]:
+            raise UploadConflict(f"Upload is incomplete, {upload['offset']} of {upload['size']} bytes were uploaded", upload["offset"])
+        file = open(self._path(upload_id, ".part"), "rb")
+        if upload["checksum"] is not None:
+            file_hash = hashlib.sha256()
+            while data := file.read(1024 * 1024):
+                file_hash.update(data)
+            if file_hash.hexdigest() != upload["checksum"].lower():
+                file.close()
+                raise ChecksumMismatch("Checksum of the uploaded file does not match")
+            file.seek(0)
+        return UploadedFile(file, name=f"{upload_id}.zip", content_type="application/zip", size=upload["size"])
+
+    def remove(self, upload_id: str):
+        for suffix in [".json", ".part", ".lock"]:
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def expire(self):
+        """ Removes uploads that were not written to for max_age seconds and lock files left over by removed uploads """
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".lock"):
+                    if not os.path.exists(os.path.join(self.directory, entry.name[:-len(".lock")] + ".part")):
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+                    continue
+                if not entry.name.endswith(".part"):
+                    continue
+                try:
+                    if entry.stat().st_mtime < now - self.max_age:
+                        self.remove(entry.name[:-len(".part")])
+                        self._logger.debug(f"Removed expired upload {entry.name}")
+                except FileNotFoundError:
+                    continue
+
+
+_store: UploadStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """ Returns the upload store of the process, configured by ROCRATE_UPLOAD """
+    global _store
+    upload_settings = getattr(settings, "ROCRATE_UPLOAD", {})
+    directory = str(upload_settings.get("UPLOAD_DIR", os.path.join(settings.BASE_DIR, "uploads")))
+    with _store_lock:
+        if _store is None or _store.directory != directory:
+            _store = UploadStore(
+                directory,
+                max_size=upload_settings.get("MAX_SIZE", 20 * 1024 ** 3),
+                max_chunk_size=upload_settings.get("MAX_CHUNK_SIZE", 64 * 1024 ** 2),
+                max_age=upload_settings.get("MAX_AGE", 24 * 60 * 60),
+            )
+        return _store
@@ -1,7 +1,6 @@
 from datetime import datetime
 from typing import Any, cast
 
-from pyld import jsonld
 from django.http import JsonResponse, Http404, HttpResponse
 from django.shortcuts import render
 from django.urls import reverse
@@ -11,10 +10,11 @@ from requests import HTTPError, RequestException
 from signposting import LinkRel, Signpost
 import requests
 
-from cwr_frontend.jsonld_utils import pyld_caching_document_loader, cached_frame
+from cwr_frontend.jsonld_utils import frame_dataset
 from cwr_frontend.cordra.CordraConnector import CordraConnector
+from cwr_frontend.object_graph import ObjectGraph, get_types
 from cwr_frontend.rocrate_io import as_ROCrate
-from cwr_frontend.workflow_graph import build_workflow_graph
+from cwr_frontend.workflow_graph import cached_workflow_graph, find_workflow
 
 
 
@@ -54,17 +54,13 @@ class DatasetDetailView(TemplateView):
     def render(self, request, id: str, nested=False, workflow_only=False) -> HttpResponse:
         """ Return a html representation with signposts from the given digital object """
 
-        objects = self._connector.resolve_objects(id, nested=nested, workflow_only=workflow_only)
+        resolved_objects, graph_version = self._connector.resolve_objects_versioned(id, nested=nested, workflow_only=workflow_only)
+        objects = ObjectGraph(resolved_objects)
         dataset = objects[id]
 
         authors = []
-        for elem_id, elem in objects.items():
-            if elem_id not in dataset["author"]:
-                continue
-            types = elem.get("@type", []) or []
-            if isinstance(types, str):
-                types = [types]
-            if not any(t in ("Person", "Organization") for t in types):
+        for elem in objects.get_all(dataset["author"]):
+            if not any(t in ("Person", "Organization") for t in get_types(elem)):
                 continue
             authors.append((elem["name"], elem.get("identifier")))
 
@@ -73,7 +69,7 @@ class DatasetDetailView(TemplateView):
         link_rocrate = request.build_absolute_uri(reverse("dataset_detail", args=[id])) + "?format=ROCrate"
         link_digital_object = request.build_absolute_uri(reverse("dataset_detail", args=[id])) + "?format=json"
 
-        prov_action = next(iter(elem for (key, elem) in objects.items() if "CreateAction" in elem["@type"]), None)
+        prov_action = objects.first_of_type("CreateAction")
         prov_context: dict[str, Any] | None
         if prov_action is None:
             # if there is no provenance, check if there is a parent dataset to link to
@@ -88,15 +84,15 @@ class DatasetDetailView(TemplateView):
             prov_start_time = prov_action.get("startTime", None)
             prov_end_time = prov_action.get("endTime", None)
 
-            prov_agent = next(iter(elem for (key, elem) in objects.items() if elem["@id"] == prov_agent_internal_id), None)
+            prov_agent = next(iter(objects.get_all(prov_agent_internal_id)), None)
             if prov_agent is not None:
                 prov_agent_id = prov_agent.get("identifier")
                 prov_agent_name = prov_agent.get("name")
 
-            parameters = [(elem.get("name"), elem.get("value")) for (key, elem) in objects.items() if elem["@id"] in prov_action.get("object", [])]
+            parameters = [(elem.get("name"), elem.get("value")) for elem in objects.get_all(prov_action.get("object", []))]
 
             prov_instrument_internal_id = prov_action.get("instrument")
-            prov_instrument_obj = next(iter(elem for (key, elem) in objects.items() if elem["@id"] == prov_instrument_internal_id and prov_instrument_internal_id is not None), None)
+            prov_instrument_obj = next(iter(objects.get_all(prov_instrument_internal_id)), None)
             prov_instrument = {}
             
             if prov_instrument_internal_id is not None and prov_instrument_obj is not None:
@@ -119,16 +115,10 @@ class DatasetDetailView(TemplateView):
 
         workflow_graph = None
         workflow_graph_error = None
-        instrument_url = None
-        if prov_context is not None:
-            instrument_url = prov_context.get("instrument", {}).get("url")
-
-        if instrument_url:
-            graph_payload, graph_status_code = build_workflow_graph(
-                workflow_url=instrument_url,
-                workflow_raw=None,
-                uploaded_file=None,
-            )
+        workflow = find_workflow(objects)
+        if workflow is not None:
+            workflow_id, payload_name = workflow
+            graph_payload, graph_status_code = cached_workflow_graph(self._connector, workflow_id, payload_name)
             if graph_status_code == 200:
                 workflow_graph = graph_payload
             else:
@@ -149,17 +139,15 @@ class DatasetDetailView(TemplateView):
             "provenance": prov_context,
             "date_modified": datetime.strptime(dataset["dateModified"], "%Y-%m-%dT%H:%M:%S.%fZ"),
             "date_created": datetime.strptime(dataset["dateCreated"], "%Y-%m-%dT%H:%M:%S.%fZ"),
-            "sd": self._jsonld(id, objects),
+            "sd": self._jsonld(id, objects, graph_version),
             "workflow_graph": workflow_graph,
             "workflow_graph_error": workflow_graph_error,
         }
 
         # get list of items and their content type: tuple of absolute_url, content_type
         items = []
-        for part_id in dataset["hasPart"]:
-            item = next((elem for (key, elem) in objects.items() if key == part_id), None)
-            if item is None:
-                continue
+        for item in objects.get_all(dataset["hasPart"]):
+            part_id = item["@id"]
             if "Dataset" in item["@type"]:
                 item_abs_url = request.build_absolute_uri(reverse("dataset_detail", args=[part_id]))
                 items.append({
@@ -256,8 +244,7 @@ class DatasetDetailView(TemplateView):
         except RequestException:
             return self._service_unavailable_response(request, id, self._error_message, response_format, accept, download)
 
-    def _jsonld(self, object_id, objects):
-        jsonld.set_document_loader(pyld_caching_document_loader)
-        framed = cached_frame({"@graph": list(objects.values())}, {"@context": "https://schema.org", "@graph": [{"name": objects[object_id]["name"]}]})
+    def _jsonld(self, object_id, objects, version):
+        framed = dict(frame_dataset(object_id, objects, version))  # copy, the cached result must not be modified
         framed["@type"] = ["Dataset", "ItemPage"]
         return framed
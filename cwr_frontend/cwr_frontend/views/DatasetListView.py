@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Any
 
+from django.conf import settings
 from django.core.paginator import Paginator, Page, EmptyPage
 from django.http import HttpResponseRedirect
 from django.urls import reverse
@@ -12,6 +13,7 @@ import logging
 from django_signposting.utils import add_signposts
 from signposting import Signpost, LinkRel
 
+from cwr_frontend.caching import shared_cache
 from cwr_frontend.cordra.CordraConnector import CordraConnector
 
 
@@ -22,6 +24,12 @@ class DatasetListView(TemplateView):
 
     _logger = logging.getLogger(__name__)
 
+    # fields of the datasets shown in the list. Cordra cannot count array items, so hasPart is fetched as a whole,
+    # but only the first item of mentions is needed to tell if there is provenance
+    _list_fields = ["/id", "/content/name", "/content/description", "/content/license", "/content/hasPart",
+                    "/content/mainEntity", "/content/mentions/0", "/content/isPartOf",
+                    "/content/dateModified", "/content/dateCreated"]
+
     class DatasetPaginator(Paginator):
         def __init__(self, connector: CordraConnector, page_size, list_all, logger: logging.Logger):
             self.connector = connector
@@ -29,24 +37,33 @@ class DatasetListView(TemplateView):
             self.list_all = list_all
             self._logger = logger
             self._count = None
-            self._cached_page = None
+            self._cached_page: Page | None = None
             super().__init__([], page_size)
 
         @property
         def count(self):
             if self._count is None:
-                response = self.connector.list_datasets(1, self.page_size, self.list_all)
-                self._count = response["size"]
-                self._cached_page = self._results_to_page(response["results"], 0)
+                # the total is part of every search response, so fetching the first page also sets the count
+                self._fetch_page(1)
             return self._count
 
         def page(self, number):
+            # fetch the requested page before validating the number, so that one search returns both page and total
+            if isinstance(number, int) and number >= 1 and (self._cached_page is None or self._cached_page.number != number):
+                self._fetch_page(number)
             number = self.validate_number(number)
-            if self._cached_page is not None and self._cached_page.number == number:
-                return self._cached_page
-
-            response = self.connector.list_datasets(number-1, self.page_size, self.list_all)
-            return self._results_to_page(response["results"], number)
+            if self._cached_page is None or self._cached_page.number != number:
+                self._fetch_page(number)
+            return self._cached_page
+
+        def _fetch_page(self, number: int):
+            cache_key = f"dataset-list-{number}-size={self.page_size}-nested={self.list_all}"
+            response = shared_cache.get(cache_key)
+            if response is None:
+                response = self.connector.list_datasets(number - 1, self.page_size, self.list_all, DatasetListView._list_fields)
+                shared_cache.set(cache_key, response, settings.DATASET_LIST_CACHE_TIMEOUT)
+            self._count = response["size"]
+            self._cached_page = self._results_to_page(response["results"], number)
 
         def _results_to_page(self, results: list[dict[str, Any]], page_num: int) -> Page:
             items_reduced = []
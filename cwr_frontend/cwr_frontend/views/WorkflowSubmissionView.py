@@ -7,7 +7,9 @@ from django.conf import settings
 from django.shortcuts import render
 from django.views.generic import TemplateView
 from allauth.socialaccount.models import SocialAccount
-from cwr_frontend.rocrate_io import get_crate_workflow_from_zip, get_crate_workflow_from_id
+from cwr_frontend.cordra.CordraConnector import CordraConnector
+from cwr_frontend.rocrate_io import get_crate_workflow_from_id
+from cwr_frontend.rocrate_upload import get_crate_workflow_from_zip
 from cwr_frontend.workflowservice.WorkflowServiceConnector import WorkflowServiceConnector
 
 
@@ -16,6 +18,7 @@ class WorkflowSubmissionView(TemplateView):
 
     _logger = logging.getLogger(__name__)
     _connector = WorkflowServiceConnector()
+    _cordra_connector = CordraConnector()
 
     def handle_request(self, request, **kwargs):
         if request.method == "POST":
@@ -53,7 +56,7 @@ class WorkflowSubmissionView(TemplateView):
                 return render(request, self.template_name, context=context)
         else:
             crate_id = request.GET["crate_id"]
-            crate, workflow = get_crate_workflow_from_id(request, crate_id)
+            crate, workflow = get_crate_workflow_from_id(request, crate_id, self._cordra_connector)
 
         workflow_name = crate.root_dataset.get("name", "Workflow")
         workflow_description = crate.root_dataset.get("description", None)
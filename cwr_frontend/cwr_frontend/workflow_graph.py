@@ -1,61 +1,157 @@
+import hashlib
+from collections.abc import Callable
 from typing import Any
 from urllib.parse import urlparse
 
-import requests
-from requests import RequestException
+from requests import HTTPError, RequestException
 import yaml
+from django.conf import settings
 
+from cwr_frontend.argo_graph import workflow_to_graph
+from cwr_frontend.caching import shared_cache
+from cwr_frontend.cordra.CordraConnector import CordraConnector
+from cwr_frontend.http_session import get_pooled_session
+from cwr_frontend.object_graph import ObjectGraph, get_types
 from cwr_frontend.workflowservice.WorkflowServiceConnector import WorkflowServiceConnector
 
+# graphs are cached by the sha256 of the workflow file, so identical workflows are only rendered once
+GRAPH_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# the sha256 of the workflow file of an instrument object is cached to skip downloading the file
+WORKFLOW_DIGEST_CACHE_TIMEOUT = 60 * 60 * 24
+# graphs of the local engine built while the workflow service is unavailable
+FALLBACK_GRAPH_CACHE_TIMEOUT = 60
+# workflow files given by url are fetched with a pool of keep-alive connections shared by the threads of a worker
+_url_session = get_pooled_session("workflow-url", timeout=20, verify=False)
+
+
 def build_workflow_graph(
     *,
     workflow_url: str | None,
     workflow_raw: str | None,
     uploaded_file=None,
 ) -> tuple[dict[str, Any], int]:
-    
+    fetch_workflow = None
+    filename = "workflow.yaml"
+    if uploaded_file is None and workflow_url:
+        parsed = urlparse(workflow_url)
+        filename = (parsed.path.split("/")[-1] if parsed.path else "") or filename
+
+        def fetch_workflow() -> bytes:
+            response = _url_session.get(workflow_url, endpoint="workflow-url")
+            response.raise_for_status()
+            return response.content
+
+    graph, status_code, _ = _build_workflow_graph(workflow_raw=workflow_raw, uploaded_file=uploaded_file,
+                                                  fetch_workflow=fetch_workflow, filename=filename)
+    return graph, status_code
+
+
+def cached_workflow_graph(connector: CordraConnector, workflow_id: str, payload_name: str) -> tuple[dict[str, Any], int]:
+    """
+    build_workflow_graph for the workflow file of a cordra object, which is the payload payload_name of the object.
+    Remembers the hash of the file per object id, so that cached graphs are found without downloading the file again.
+    """
+    digest_cache_key = f"workflow-digest-{workflow_id}"
+    digest = shared_cache.get(digest_cache_key)
+    if digest is not None:
+        graph = shared_cache.get(_graph_cache_key(digest))
+        if graph is not None:
+            return graph, 200
+
+    graph, status_code, digest = _build_workflow_graph(workflow_raw=None, uploaded_file=None,
+                                                       fetch_workflow=lambda: connector.get_payload(workflow_id, payload_name),
+                                                       filename=payload_name)
+    if digest is not None:
+        shared_cache.set(digest_cache_key, digest, WORKFLOW_DIGEST_CACHE_TIMEOUT)
+    return graph, status_code
+
+
+def find_workflow(objects: ObjectGraph) -> tuple[str, str] | None:
+    """ Returns id and payload name of the workflow that created the dataset (the instrument of its CreateAction), if any """
+    action = objects.first_of_type("CreateAction")
+    if action is None:
+        return None
+    instrument = next(iter(objects.get_all(action.get("instrument"))), None)
+    if instrument is None or "ComputationalWorkflow" not in get_types(instrument):
+        return None
+    return instrument["@id"], instrument["contentUrl"]
+
+
+def _graph_cache_key(digest: str) -> str:
+    # graphs of the local engine and the workflow service are not cached under the same key
+    engine = "local" if getattr(settings, "WORKFLOW_GRAPH_ENGINE", "auto") == "local" else "service"
+    return f"workflow-graph-{engine}-{digest}"
+
+
+def _build_workflow_graph(
+    *,
+    workflow_raw: str | None,
+    uploaded_file=None,
+    fetch_workflow: Callable[[], bytes] | None = None,
+    filename: str = "workflow.yaml",
+) -> tuple[dict[str, Any], int, str | None]:
+    """
+    Returns graph (or error detail), status code and the sha256 of the workflow file if the graph was built.
+    The workflow is read from the uploaded file, fetched with fetch_workflow or given as workflow_raw.
+    """
     workflow_service = WorkflowServiceConnector()
 
     yaml_bytes: bytes | None = None
-    filename = "workflow.yaml"
 
     if uploaded_file is not None:
         yaml_bytes = uploaded_file.read()
         if uploaded_file.name:
             filename = uploaded_file.name
-    elif workflow_url:
-        parsed = urlparse(workflow_url)
-        candidate_name = parsed.path.split("/")[-1] if parsed.path else ""
-        if candidate_name:
-            filename = candidate_name
+    elif fetch_workflow is not None:
         try:
-            response = requests.get(workflow_url, timeout=20, verify=False)
-            if response.status_code == 404:
-                return {"detail": f"Workflow URL not found: {workflow_url}"}, 404
-
-            response.raise_for_status()
-            yaml_bytes = response.content
+            yaml_bytes = fetch_workflow()
+        except HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return {"detail": f"Workflow URL not found: {e.response.url}"}, 404, None
+            return {"detail": "Failed to fetch workflow from provided URL."}, 502, None
         except RequestException:
-            return {"detail": "Failed to fetch workflow from provided URL."}, 502
+            return {"detail": "Failed to fetch workflow from provided URL."}, 502, None
     else:
         yaml_bytes = str(workflow_raw).encode("utf-8")
 
     if not yaml_bytes:
-        return {"detail": "Workflow input is empty."}, 400
+        return {"detail": "Workflow input is empty."}, 400, None
+
+    digest = hashlib.sha256(yaml_bytes).hexdigest()
+    graph = shared_cache.get(_graph_cache_key(digest))
+    if graph is not None:
+        return graph, 200, digest
 
     try:
         parsed_yaml = yaml.safe_load(yaml_bytes)
         if parsed_yaml is None:
-            return {"detail": "Workflow YAML is empty after parsing."}, 400
+            return {"detail": "Workflow YAML is empty after parsing."}, 400, None
     except yaml.YAMLError as exc:
-        return {"detail": f"Invalid YAML: {exc}"}, 400
+        return {"detail": f"Invalid YAML: {exc}"}, 400, None
+
+    engine = getattr(settings, "WORKFLOW_GRAPH_ENGINE", "auto")
+    cache_timeout = GRAPH_CACHE_TIMEOUT
+    if engine == "local":
+        try:
+            graph = workflow_to_graph(parsed_yaml)
+        except ValueError as exc:
+            return {"detail": f"Invalid workflow: {exc}"}, 400, None
+    else:
+        try:
+            graph = workflow_service.visualize_workflow(
+                yaml_bytes,
+                filename=filename,
+            )
+        except RequestException:
+            if engine != "auto":
+                return {"detail": "Workflow service failed to generate graph."}, 502, None
+            # fall back to the local engine, but try the workflow service again soon
+            try:
+                graph = workflow_to_graph(parsed_yaml)
+            except ValueError:
+                return {"detail": "Workflow service failed to generate graph."}, 502, None
+            cache_timeout = FALLBACK_GRAPH_CACHE_TIMEOUT
+
+    shared_cache.set(_graph_cache_key(digest), graph, cache_timeout)
+    return graph, 200, digest
 
-    try:
-        graph = workflow_service.visualize_workflow(
-            yaml_bytes,
-            filename=filename,
-        )
-    except RequestException:
-        return {"detail": "Workflow service failed to generate graph."}, 502
-
-    return graph, 200
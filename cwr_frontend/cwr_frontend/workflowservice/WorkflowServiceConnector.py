@@ -1,12 +1,28 @@
+import hashlib
+import json
 from datetime import datetime
 from typing import Any, Optional
 from urllib.parse import urljoin, quote_plus
-import requests
 from requests.auth import HTTPBasicAuth
 import yaml
 from django.conf import settings
 from rest_framework.exceptions import APIException, NotFound
 
+from cwr_frontend.caching import SingleFlight, shared_cache
+from cwr_frontend.http_session import get_pooled_session
+
+# results of workflow checks are cached by the canonical hash of the workflow and the version of the workflow service
+LINT_CACHE_TIMEOUT = 60 * 60 * 24
+_CACHED_CHECK_STATUS_CODES = (200, 400, 422)
+# concurrent checks of the same workflow within a worker share one request to the workflow service
+_lint_flight = SingleFlight()
+
+
+def workflow_digest(workflow: dict[str, Any]) -> str:
+    """ sha256 of a parsed workflow, independent of the formatting, comments and key order of its YAML file """
+    canonical = json.dumps(workflow, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
 
 class WorkflowServiceConnector:
 
@@ -17,16 +33,43 @@ class WorkflowServiceConnector:
         self._username = username
         self._password = password
         self._verify_ssl = verify_ssl
+        self._auth = HTTPBasicAuth(self._username, self._password)
+        # all connectors of a worker process share one pool of keep-alive connections to the workflow service
+        self._http = get_pooled_session(
+            "workflow-service",
+            pool_size=settings.WORKFLOW_SERVICE["POOL_SIZE"],
+            timeout=settings.WORKFLOW_SERVICE["TIMEOUT"],
+            retries=settings.WORKFLOW_SERVICE["RETRIES"],
+        )
+        service = f"{self._base_url}|{settings.WORKFLOW_SERVICE.get('VERSION', '')}"
+        self._lint_cache_prefix = f"workflow-check-{hashlib.sha1(service.encode('utf-8')).hexdigest()}"
+
+    @property
+    def latency_stats(self) -> dict[str, dict[str, float]]:
+        """ Request counters and latencies per workflow service endpoint of this worker process """
+        return self._http.stats.snapshot()
 
     def check_workflow(self, workflow: dict[str, Any]) -> tuple[bool, dict[str, Any]]:
+        """ Lints the workflow. Results of valid and invalid workflows are cached, see LINT_CACHE_TIMEOUT """
+        cache_key = f"{self._lint_cache_prefix}-{workflow_digest(workflow)}"
+        result = shared_cache.get(cache_key)
+        if result is None:
+            result = _lint_flight.do(cache_key, lambda: self._check_workflow(workflow, cache_key))
+        return result
+
+    def _check_workflow(self, workflow: dict[str, Any], cache_key: str) -> tuple[bool, dict[str, Any]]:
         files = {"file": ("workflow.yaml", yaml.dump(workflow, indent=2))}
-        response = requests.post(urljoin(self._base_url, "workflow/check"), files=files, auth=HTTPBasicAuth(self._username, self._password), verify=self._verify_ssl)
-        if response.status_code != 200:
-            if 400 <= response.status_code < 500:
-                return False, response.json()
-            else:
-                response.raise_for_status()
-        return True, response.json()
+        response = self._http.post(urljoin(self._base_url, "workflow/check"), endpoint="workflow/check", idempotent=True,
+                                   files=files, auth=self._auth, verify=self._verify_ssl)
+        if 400 <= response.status_code < 500:
+            result = (False, response.json())
+        else:
+            response.raise_for_status()
+            result = (True, response.json())
+        # results of other client errors, i.e. authentication or rate limiting, do not depend on the workflow
+        if response.status_code in _CACHED_CHECK_STATUS_CODES:
+            shared_cache.set(cache_key, result, LINT_CACHE_TIMEOUT)
+        return result
 
     def submit_workflow(
         self,
@@ -55,7 +98,8 @@ class WorkflowServiceConnector:
             "webhookURL" : webhook_url,
             "force": force,
         }
-        response = requests.post(urljoin(self._base_url, "workflow/submit"), files=files, data=form_data, auth=HTTPBasicAuth(self._username, self._password), verify=self._verify_ssl)
+        response = self._http.post(urljoin(self._base_url, "workflow/submit"), endpoint="workflow/submit",
+                                   files=files, data=form_data, auth=self._auth, verify=self._verify_ssl)
         if response.status_code != 200:
             if 400 <= response.status_code < 500:
                 return False, response.json()
@@ -66,10 +110,12 @@ class WorkflowServiceConnector:
     def visualize_workflow(self, yaml_bytes: bytes, filename: str = 'workflow.yaml') -> dict[str, Any]:
         """POST a workflow YAML to the graph endpoint and return the Cytoscape-compatible graph JSON."""
         files = {"file": (filename, yaml_bytes, "application/x-yaml")}
-        response = requests.post(
+        response = self._http.post(
             urljoin(self._base_url, "workflow/graph"),
+            endpoint="workflow/graph",
+            idempotent=True,
             files=files,
-            auth=HTTPBasicAuth(self._username, self._password),
+            auth=self._auth,
             verify=self._verify_ssl,
         )
         response.raise_for_status()
@@ -78,7 +124,7 @@ class WorkflowServiceConnector:
     def list_workflows(self) -> list[dict[str, Any]]:
         """ retrieve list of objects from cordra """
         url = f'{urljoin(self._base_url, "workflow/list")}'
-        response = requests.get(url, auth=HTTPBasicAuth(self._username, self._password), verify=self._verify_ssl)
+        response = self._http.get(url, endpoint="workflow/list", auth=self._auth, verify=self._verify_ssl)
         if response.status_code != 200:
             raise Exception(response.text)
 
@@ -95,7 +141,7 @@ class WorkflowServiceConnector:
         Get details of a specific workflow
         """
         url = f'{urljoin(self._base_url, f"workflow/detail/{workflow_id}")}'
-        response = requests.get(url, auth=HTTPBasicAuth(self._username, self._password), verify=self._verify_ssl)
+        response = self._http.get(url, endpoint="workflow/detail", auth=self._auth, verify=self._verify_ssl)
         if response.status_code != 200:
             if response.status_code == 404:
                 raise NotFound(detail=response.text)
@@ -15,6 +15,11 @@ python manage.py collectstatic --no-input --clear
 echo "Apply database migrations"
 python manage.py migrate --noinput
 
+if [ "$WARM_CACHE" = "TRUE" ]; then
+  echo "Warm caches"
+  python manage.py warm_cache || echo "Cache warm-up failed - continuing..."
+fi
+
 FRONTEND_PORT=${FRONTEND_PORT:-8000}
 echo "Starting Gunicorn on port $FRONTEND_PORT..."
 